@@ -22,6 +22,7 @@
 #
 
 import math
+from array import array
 
 class SineColorCycler:
     """
@@ -32,8 +33,9 @@ class SineColorCycler:
     We are basically sliding red/green/blue values through a range using a sine wave and
     can alter the center line and amplitude to adjust the range of colors calculated.
 
-    The sequence of colors is generated into a Python list (which
-    acts like a cached set of generated colors).
+    The sequence of colors is generated into an array('I') of 0xRRGGBB
+    values (which acts like a cached set of generated colors). Color lists can also be
+    obtained from a class level cache with get_color_list().
 
     Example 1 (for binary RGB colors):
         cc = ColorCycler()
@@ -47,9 +49,20 @@ class SineColorCycler:
         for i in range(len(tkcolor_list)):
             tkcolor = tkcolor_list[i]
     """
+    # Class level cache of color lists, least recently used first
+    CACHE_MAX_BYTES = 16 * 1024
+    _cache = {}
+    _cache_lru = []
+    _cache_bytes = 0
+
+    # Sine lookup table (one full wave) used instead of math.sin when
+    # sine_table is True. Values are sin * 32767.
+    SINE_TABLE_SIZE = 1024
+    _sine_table = None
+
     def __init__(self, red_freq=None, green_freq=None, blue_freq=None,
                  red_phase=0.0, green_phase=2.0, blue_phase=4.0,
-                 center=128, width=127, cycles=32):
+                 center=128, width=127, cycles=32, sine_table=False):
         """
         Creates a color generator for a given set of parameters. The defaults produce
         a set of colors with a full color spectrum. For pastel colors, try
@@ -67,7 +80,10 @@ class SineColorCycler:
         0-255, the value of center + width should be in the range 0-255.
         :param cycles: The number of colors to be generated for a sequence.
         Essentially, this is the size of the list that will be generated.
+        :param sine_table: True to evaluate the sine wave from a lookup table
+        instead of math.sin.
         """
+        self.sine_table = sine_table
         # The default for freq is to set it to a value that will produce
         # one sine wave.
         self.__initialize(red_freq, green_freq, blue_freq,
@@ -151,9 +167,78 @@ class SineColorCycler:
         Generates a list of colors based on the instance initialization properties.
         :return:
         """
-        self.__calculated_colors = []
-        for i in range(self.colors):
-            self.__calculated_colors.append(self.__calculate_next_color(i))
+        self.__calculated_colors = array("I", bytearray(4 * self.colors))
+        if self.sine_table:
+            SineColorCycler.__build_sine_table()
+            for i in range(self.colors):
+                self.__calculated_colors[i] = self.__calculate_table_color(i)
+        else:
+            for i in range(self.colors):
+                self.__calculated_colors[i] = self.__calculate_next_color(i)
+
+    @classmethod
+    def get_color_list(cls, center=128, width=127, colors=32,
+                       red_phase=0.0, green_phase=2.0, blue_phase=4.0, sine_table=False):
+        """
+        Returns a cached color list (an array('I')) for a set of parameters,
+        creating it if necessary. The cache is bounded by CACHE_MAX_BYTES and
+        the least recently used lists are evicted first. The returned list is
+        shared and must not be modified.
+        :param center: See create_color_list()
+        :param width: See create_color_list()
+        :param colors: See create_color_list()
+        :param red_phase: See create_color_list()
+        :param green_phase: See create_color_list()
+        :param blue_phase: See create_color_list()
+        :param sine_table: True to use the sine lookup table (an approximation
+        that can differ from math.sin by one in a color component)
+        :return: The color list
+        """
+        key = (center, width, colors, red_phase, green_phase, blue_phase, sine_table)
+        color_list = cls._cache.get(key)
+        if color_list is not None:
+            # Most recently used goes to the end
+            cls._cache_lru.remove(key)
+            cls._cache_lru.append(key)
+            return color_list
+
+        color_gen = cls(sine_table=sine_table)
+        color_list = color_gen.create_color_list(red_phase=red_phase, green_phase=green_phase,
+                                                 blue_phase=blue_phase, center=center,
+                                                 width=width, colors=colors)
+        size = 4 * len(color_list)
+        if size <= cls.CACHE_MAX_BYTES:
+            while cls._cache_bytes + size > cls.CACHE_MAX_BYTES:
+                evicted = cls._cache.pop(cls._cache_lru.pop(0))
+                cls._cache_bytes -= 4 * len(evicted)
+            cls._cache[key] = color_list
+            cls._cache_lru.append(key)
+            cls._cache_bytes += size
+        return color_list
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        Empty the color list cache
+        :return: None
+        """
+        cls._cache = {}
+        cls._cache_lru = []
+        cls._cache_bytes = 0
+
+    @classmethod
+    def __build_sine_table(cls):
+        """
+        Build the sine lookup table once
+        :return: None
+        """
+        if cls._sine_table is not None:
+            return
+        size = cls.SINE_TABLE_SIZE
+        table = array("h", bytearray(2 * size))
+        for i in range(size):
+            table[i] = int(round(math.sin((math.pi * 2.0 * i) / size) * 32767.0))
+        cls._sine_table = table
 
     @staticmethod
     def to_tkcolor_list(color_list):
@@ -175,7 +260,24 @@ class SineColorCycler:
         blue = SineColorCycler.__calc_color_component(cycle, self.blue_freq, self.blue_phase, self.width, self.center)
         # print(cycle, red, green, blue)
 
-        return 0xff000000 | (red << 16) | (green << 8) | (blue << 0);
+        # 0xRRGGBB stays a small int on MicroPython (below 2**30)
+        return (red << 16) | (green << 8) | (blue << 0)
+
+    def __calculate_table_color(self, cycle):
+        red = self.__calc_table_component(cycle, self.red_freq, self.red_phase)
+        green = self.__calc_table_component(cycle, self.green_freq, self.green_phase)
+        blue = self.__calc_table_component(cycle, self.blue_freq, self.blue_phase)
+        return (red << 16) | (green << 8) | (blue << 0)
+
+    def __calc_table_component(self, cycle, freq, phase):
+        """
+        Same as __calc_color_component, but the sine comes from the lookup table.
+        :return:
+        """
+        size = SineColorCycler.SINE_TABLE_SIZE
+        index = int(round(((freq * cycle) + phase) * size / (math.pi * 2.0))) % size
+        sine = SineColorCycler._sine_table[index] / 32767.0
+        return int((sine * self.width) + self.center) % 256
 
     @staticmethod
     def __calc_color_component(cycle, freq, phase, width, center):
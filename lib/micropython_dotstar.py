@@ -30,11 +30,18 @@
 * Author(s): Damien P. George, Limor Fried, Scott Shawcroft, Matt Trentini
 """
 
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
 __version__ = "0.0.0-auto.0"
 __repo__ = "https://github.com/mattytrentini/micropython-dotstar"
 
 START_HEADER_SIZE = 4
 LED_START = 0b11100000  # Three "1" bits, followed by 5 brightness bits
+# Pixel header at full per-pixel brightness
+LED_HEADER = LED_START | 0b00011111
 
 # Pixel color order constants
 RGB = (0, 1, 2)
@@ -44,6 +51,26 @@ GBR = (1, 2, 0)
 BRG = (2, 0, 1)
 BGR = (2, 1, 0)
 
+# Copy pixels [start, end) of src to dst, passing the three color bytes
+# of each pixel through lut and copying the header byte as is
+if micropython is not None:
+    @micropython.viper
+    def _lut_copy_pixels(src, dst, lut, start: int, end: int):
+        s = ptr8(src)
+        d = ptr8(dst)
+        t = ptr8(lut)
+        i = start
+        while i < end:
+            d[i] = s[i]
+            d[i + 1] = t[s[i + 1]]
+            d[i + 2] = t[s[i + 2]]
+            d[i + 3] = t[s[i + 3]]
+            i += 4
+else:
+    def _lut_copy_pixels(src, dst, lut, start, end):
+        dst[start:end] = src[start:end].translate(lut)
+        dst[start:end:4] = src[start:end:4]
+
 
 class DotStar:
     """
@@ -81,6 +108,10 @@ class DotStar:
             self.end_header_size += 1
         self._buf = bytearray(n * 4 + START_HEADER_SIZE + self.end_header_size)
         self.end_header_index = len(self._buf) - self.end_header_size
+        # Byte offsets of red, green and blue within a pixel (set with pixel_order)
+        self._red_offset = 1
+        self._green_offset = 2
+        self._blue_offset = 3
         self.pixel_order = pixel_order
         # Four empty bytes to start.
         for i in range(START_HEADER_SIZE):
@@ -92,6 +123,12 @@ class DotStar:
         for i in range(self.end_header_index, len(self._buf)):
             self._buf[i] = 0xff
         self._brightness = 1.0
+        # Optional 256 entry table applied to every color byte by show(), and
+        # the preallocated output buffer it is applied into
+        self._lut = None
+        self._out_buf = None
+        # Cleared buffer image used by clear(), created on first use
+        self._blank = None
         # Set auto_write to False temporarily so brightness setter does _not_
         # call show() while in __init__.
         self.auto_write = False
@@ -158,6 +195,80 @@ class DotStar:
         self._buf[offset + 2] = rgb[self.pixel_order[1]]
         self._buf[offset + 3] = rgb[self.pixel_order[2]]
 
+    @property
+    def pixel_order(self):
+        """The pixel color order tuple"""
+        return self._pixel_order
+
+    @pixel_order.setter
+    def pixel_order(self, pixel_order):
+        self._pixel_order = pixel_order
+        # Byte offset (after the pixel header) where each color is sent
+        self._red_offset = 1 + pixel_order.index(0)
+        self._green_offset = 1 + pixel_order.index(1)
+        self._blue_offset = 1 + pixel_order.index(2)
+
+    @property
+    def color_offsets(self):
+        """Byte offsets (red, green, blue) of the colors within a pixel, after the header byte"""
+        return self._red_offset, self._green_offset, self._blue_offset
+
+    def set_pixel_rgb_int(self, index, value):
+        """
+        Fast path for setting a pixel to a 0xRRGGBB value at full per-pixel
+        brightness. Nothing is allocated and auto_write is not honored, so
+        show() must be called to send the pixels.
+        """
+        if index >= self._n:
+            raise IndexError(f"DotStar.set_pixel_rgb_int index {index} >= numpixels {self._n}")
+        buf = self._buf
+        offset = index * 4 + START_HEADER_SIZE
+        buf[offset] = LED_HEADER
+        buf[offset + self._red_offset] = (value >> 16) & 0xff
+        buf[offset + self._green_offset] = (value >> 8) & 0xff
+        buf[offset + self._blue_offset] = value & 0xff
+
+    def set_range(self, start, values):
+        """
+        Set consecutive pixels starting at start from a sequence of 0xRRGGBB
+        values (a list or array). Like set_pixel_rgb_int, nothing is allocated
+        and show() must be called to send the pixels.
+        """
+        if start + len(values) > self._n:
+            raise IndexError(f"DotStar.set_range {start}+{len(values)} > numpixels {self._n}")
+        buf = self._buf
+        red_offset = self._red_offset
+        green_offset = self._green_offset
+        blue_offset = self._blue_offset
+        offset = start * 4 + START_HEADER_SIZE
+        for value in values:
+            buf[offset] = LED_HEADER
+            buf[offset + red_offset] = (value >> 16) & 0xff
+            buf[offset + green_offset] = (value >> 8) & 0xff
+            buf[offset + blue_offset] = value & 0xff
+            offset += 4
+
+    def set_rgb_buffer(self, start, rgb_buf):
+        """
+        Set consecutive pixels starting at start from a packed r, g, b
+        buffer (3 bytes per pixel). Like set_pixel_rgb_int, nothing is
+        allocated and show() must be called to send the pixels.
+        """
+        count = len(rgb_buf) // 3
+        if start + count > self._n:
+            raise IndexError(f"DotStar.set_rgb_buffer {start}+{count} > numpixels {self._n}")
+        buf = self._buf
+        red_offset = self._red_offset
+        green_offset = self._green_offset
+        blue_offset = self._blue_offset
+        offset = start * 4 + START_HEADER_SIZE
+        for src in range(0, count * 3, 3):
+            buf[offset] = LED_HEADER
+            buf[offset + red_offset] = rgb_buf[src]
+            buf[offset + green_offset] = rgb_buf[src + 1]
+            buf[offset + blue_offset] = rgb_buf[src + 2]
+            offset += 4
+
     def __setitem__(self, index, val):
         if isinstance(index, slice):
             start, stop, step = index.indices(self._n)
@@ -194,6 +305,11 @@ class DotStar:
     def __len__(self):
         return self._n
 
+    @property
+    def buf(self):
+        """The pixel buffer, including the start and end frames"""
+        return self._buf
+
     @property
     def brightness(self):
         """Overall brightness of the pixel"""
@@ -202,9 +318,54 @@ class DotStar:
     @brightness.setter
     def brightness(self, brightness):
         self._brightness = min(max(brightness, 0.0), 1.0)
+        # Brightness is applied through the color table
+        if self._brightness < 1.0:
+            lut = bytearray(256)
+            for i in range(256):
+                lut[i] = int(i * self._brightness)
+            self._lut = lut
+        else:
+            self._lut = None
         if self.auto_write:
             self.show()
 
+    @property
+    def lut(self):
+        """256 entry table applied to every color byte by show(), or None"""
+        return self._lut
+
+    @lut.setter
+    def lut(self, lut):
+        # Replaces any table derived from brightness
+        self._lut = lut
+        if self.auto_write:
+            self.show()
+
+    def _blank_image(self):
+        """The cleared buffer image, created on first use"""
+        if self._blank is None:
+            self._blank = bytearray(len(self._buf))
+            for i in range(START_HEADER_SIZE, len(self._buf)):
+                if i >= self.end_header_index or i % 4 == 0:
+                    self._blank[i] = 0xff
+        return self._blank
+
+    def clear(self):
+        """Turns all pixels off with a single buffer copy. The start and end
+        frames and the pixel header bytes are left intact."""
+        self._buf[:] = self._blank_image()
+        if self.auto_write:
+            self.show()
+
+    def clear_range(self, start, count):
+        """Turns count pixels starting at start off with a single slice copy.
+        show() must be called to send the pixels."""
+        if start + count > self._n:
+            raise IndexError(f"DotStar.clear_range {start}+{count} > numpixels {self._n}")
+        begin = start * 4 + START_HEADER_SIZE
+        end = begin + count * 4
+        self._buf[begin:end] = memoryview(self._blank_image())[begin:end]
+
     def fill(self, color):
         """Colors all pixels the given ***color***."""
         auto_write = self.auto_write
@@ -221,18 +382,15 @@ class DotStar:
 
         The colors may or may not be showing after this function returns because
         it may be done asynchronously."""
-        # Create a second output buffer if we need to compute brightness
+        # Use the second output buffer if we need to apply the color table
         buf = self._buf
-        if self.brightness < 1.0:
-            buf = bytearray(self._buf)
-            # Four empty bytes to start.
-            for i in range(START_HEADER_SIZE):
-                buf[i] = 0x00
-            for i in range(START_HEADER_SIZE, self.end_header_index):
-                buf[i] = self._buf[i] if i % 4 == 0 else int(self._buf[i] * self._brightness)
-            # Four 0xff bytes at the end.
-            for i in range(self.end_header_index, len(buf)):
-                buf[i] = 0xff
+        lut = self._lut
+        if lut is not None:
+            if self._out_buf is None:
+                # Start and end frames are copied once
+                self._out_buf = bytearray(self._buf)
+            buf = self._out_buf
+            _lut_copy_pixels(self._buf, buf, lut, START_HEADER_SIZE, self.end_header_index)
 
         if self._spi:
             self._spi.write(buf)
\ No newline at end of file
@@ -247,7 +247,7 @@ CSS3_NAMES_TO_HEX = {
 }
 
 
-def name_to_rgb(name: str, spec: str = CSS3) -> IntegerRGB:
+def name_to_rgb(name: str, spec: str = CSS3) -> tuple:
     """
     Convert a color name to a 3-tuple of integers suitable for use in
     an ``rgb()`` triplet specifying that color.
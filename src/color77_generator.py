@@ -17,6 +17,7 @@
 #
 
 from src.pixel_generator import PixelGenerator
+from array import array
 
 
 class Color77PixelGenerator(PixelGenerator):
@@ -30,6 +31,10 @@ class Color77PixelGenerator(PixelGenerator):
     ...
     aaaaaaa...aaaaaaa
     baaaaaa...baaaaaa
+
+    The pixels are kept in a packed r, g, b bytearray (frame). Each step()
+    changes only every 7th pixel, and the indexes of those pixels are
+    left in changed[0:changed_count].
     """
     def __init__(self, num_pixels=50, color_list=None):
         """
@@ -54,27 +59,76 @@ class Color77PixelGenerator(PixelGenerator):
             self.color_list[4] = (255, 255, 255)
             self.color_list[5] = (0, 255, 255)
             self.color_list[6] = (255, 0, 255)
-        self.pixels = [self.color_list[0]] * self.num_pixels
+        # Packed frame, r, g, b per pixel
+        self.frame = bytearray(self.num_pixels * 3)
+        # Indexes of the pixels changed by the last step()
+        self.changed = array("H", bytearray(2 * ((self.num_pixels + self.num_colors - 1) // self.num_colors)))
+        self.changed_count = 0
         self.color_index = 0
         self.pixel_index = 0
+        self._fill(self.color_list[0])
+
+    def _fill(self, rgb):
+        """
+        Set every pixel of the frame to one color
+        :param rgb: 3-tuple (r,g,b)
+        :return: None
+        """
+        frame = self.frame
+        for offset in range(0, len(frame), 3):
+            frame[offset] = rgb[0]
+            frame[offset + 1] = rgb[1]
+            frame[offset + 2] = rgb[2]
+
+    @classmethod
+    def from_args(cls, num_pixels, args):
+        """
+        generator color77 [wait] [iterations] [color-list]
+        """
+        color_list = args[0] if len(args) > 0 else None
+        return cls(num_pixels=num_pixels, color_list=color_list)
 
     def start(self):
         self.color_index = 0
         self.pixel_index = 0
+        self.changed_count = 0
 
     def step(self):
-        for x in range(0, self.num_pixels, self.num_colors):
-            if x + self.pixel_index >= self.num_pixels:
-                break;
-            self.pixels[x + self.pixel_index] = self.color_list[self.color_index]
+        frame = self.frame
+        changed = self.changed
+        rgb = self.color_list[self.color_index]
+        count = 0
+        for px in range(self.pixel_index, self.num_pixels, self.num_colors):
+            offset = px * 3
+            frame[offset] = rgb[0]
+            frame[offset + 1] = rgb[1]
+            frame[offset + 2] = rgb[2]
+            changed[count] = px
+            count += 1
+        self.changed_count = count
         self.pixel_index = (self.pixel_index + 1) % self.num_colors
         if self.pixel_index == 0:
             self.color_index = (self.color_index + 1) % self.num_colors
 
     def pixel(self, n):
-        return self.pixels[n]
+        offset = n * 3
+        return self.frame[offset], self.frame[offset + 1], self.frame[offset + 2]
         # For TK
-        # return "#%02x%02x%02x" % self.pixels[n]
+        # return "#%02x%02x%02x" % self.pixel(n)
+
+    def render_into(self, buf):
+        # The frame is already in packed r, g, b form
+        buf[:] = self.frame
+
+    def pixel_value(self, n):
+        """
+        Returns pixel "n" as an integer color
+        :param n: Which pixel to return
+        :return: Integer color 0xrrggbb
+        """
+        offset = n * 3
+        frame = self.frame
+        return (frame[offset] << 16) | (frame[offset + 1] << 8) | frame[offset + 2]
 
     def stop(self):
         pass
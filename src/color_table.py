@@ -0,0 +1,94 @@
+#
+# color_table.py - named colors packed into a byte table
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+
+class ColorTable:
+    """
+    Named colors stored 3 bytes (r, g, b) per color in one bytearray.
+    Each name maps to an integer handle, the color's index in the table.
+    Redefining a name reuses its handle. Colors are read back as (r, g, b)
+    tuples. This replaces a dict of 3 element lists, which costs a list
+    object per color.
+    """
+    __slots__ = ("_rgb", "_handles", "_count")
+
+    def __init__(self, capacity=160):
+        """
+        Create an empty table
+        :param capacity: Initial number of colors (the table grows as needed)
+        """
+        self._rgb = bytearray(capacity * 3)
+        self._handles = {}
+        self._count = 0
+
+    def add(self, name, rgb):
+        """
+        Add or redefine a named color
+        :param name: Color name
+        :param rgb: A sequence of r, g, b values (0-255)
+        :return: The color's handle
+        """
+        handle = self._handles.get(name)
+        if handle is None:
+            handle = self._count
+            if (handle + 1) * 3 > len(self._rgb):
+                # Double the table
+                self._rgb.extend(bytes(len(self._rgb) or 3))
+            self._handles[name] = handle
+            self._count += 1
+        offset = handle * 3
+        self._rgb[offset] = int(rgb[0])
+        self._rgb[offset + 1] = int(rgb[1])
+        self._rgb[offset + 2] = int(rgb[2])
+        return handle
+
+    def handle(self, name):
+        """
+        Returns the handle for a color name or -1 if it is not defined
+        :param name: Color name
+        :return:
+        """
+        return self._handles.get(name, -1)
+
+    def rgb(self, handle):
+        """
+        Returns the color for a handle
+        :param handle: A handle returned by add() or handle()
+        :return: An (r, g, b) tuple
+        """
+        offset = handle * 3
+        return self._rgb[offset], self._rgb[offset + 1], self._rgb[offset + 2]
+
+    def get(self, name, default=None):
+        handle = self._handles.get(name)
+        if handle is None:
+            return default
+        return self.rgb(handle)
+
+    def names(self):
+        return self._handles.keys()
+
+    @property
+    def bytes_used(self):
+        """
+        Returns the size of the packed color bytes
+        :return:
+        """
+        return len(self._rgb)
+
+    def __contains__(self, name):
+        return name in self._handles
+
+    def __getitem__(self, name):
+        return self.rgb(self._handles[name])
+
+    def __len__(self):
+        return self._count
@@ -56,6 +56,7 @@ class Configuration():
     # All
     CFG_COLORS = "colors"
     CFG_BRIGHTNESS = "brightness"
+    CFG_GAMMA = "gamma"
     CFG_HOLD_TIME = "hold_time"
     CFG_TEST_TIME = "test_time"
     CFG_RUN_CODE = "run_code"
@@ -64,6 +65,15 @@ class Configuration():
     CFG_LOG_LEVEL = "log_level"
     CFG_LOG_DEVICES = "log_devices"
     CFG_SCRIPT_CALENDAR = "script_calendar"
+    CFG_RECORD_FILE = "record_file"
+    CFG_PROFILE = "profile"
+    CFG_TELEMETRY_INTERVAL = "telemetry_interval"
+    CFG_LIGHTSLEEP = "lightsleep"
+    CFG_ZONES = "zones"
+    CFG_OUTPUTS = "outputs"
+    CFG_OUTPUT_DRIVER = "driver"
+    CFG_STATE_MACHINE_ID = "state_machine_id"
+    CFG_SPI_ID = "spi_id"
 
     def __init__(self):
         Configuration.load_configuration()
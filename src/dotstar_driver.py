@@ -12,8 +12,9 @@
 # The dotstar module comes from the Adafruit_DotStar_Pi repo. The original
 # repo can be found at https://github.com/adafruit/Adafruit_DotStar_Pi. A fork
 # of the original repo is at https://github.com/dhocker/Adafruit_DotStar_Pi
-from micropython_dotstar import DotStar, RGB, RBG, GRB, GBR, BRG, BGR
+from micropython_dotstar import DotStar, RGB, RBG, GRB, GBR, BRG, BGR, START_HEADER_SIZE, LED_HEADER
 from .driver_base import DriverBase
+from .rotating_frame import RotatingFrame
 import mp_logging as logging
 
 #
@@ -55,7 +56,11 @@ class MPDotStar(DriverBase):
         :return: True/False
         """
         # Need to translate color order into mp_dotstar color order
-        self._strip = DotStar(spi, num_pixels, pixel_order=MPDotStar._pixel_order(order))
+        self._compile_order(order)
+        # Pixels are sent by show(), not as they are set
+        self._strip = DotStar(spi, num_pixels, auto_write=False,
+                              pixel_order=MPDotStar._pixel_order(order))
+        self._update_lut()
         # print self._strip
         self._num_pixels = num_pixels
         return self._begin()
@@ -65,12 +70,15 @@ class MPDotStar(DriverBase):
         # self._strip.begin()
         return True
 
-    def show(self):
+    def _show(self, force):
         """
-        Send all pixels to string.
+        Send all pixels to string. Unchanged frames are not sent.
+        :param force: True to send the frame even if it has not changed
         :return:
         """
-        return self._strip.show() == 0
+        if self._frame_changed(self._strip.buf, force):
+            self._strip.show()
+        return True
 
     @property
     def numPixels(self):
@@ -80,18 +88,45 @@ class MPDotStar(DriverBase):
         """
         return self._num_pixels
 
+    @property
+    def frameBuffer(self):
+        """
+        Returns the DotStar buffer (before gamma/brightness)
+        :return:
+        """
+        return self._strip.buf
+
     def setBrightness(self, brightness):
         """
         Set brightness for entire string
         :param brightness: 0 <= brightness <= 255
         :return:
         """
-        # Scale brightness to 0-1.0
-        b = float(brightness) / 255.0
-        self._strip.brightness = b
-        logger.debug(f"Brightness: {b}")
+        self._level = brightness
+        self._update_lut()
+        logger.debug(f"Brightness: {brightness}")
         return True
 
+    def setGamma(self, gamma):
+        """
+        Turn gamma correction on or off
+        :param gamma: True or False
+        :return:
+        """
+        DriverBase.setGamma(self, gamma)
+        self._update_lut()
+        return True
+
+    def _update_lut(self):
+        """
+        Hand the combined gamma/brightness table to the DotStar strip. It is
+        applied to the whole buffer when the strip is shown.
+        :return: None
+        """
+        self._build_lut()
+        if self._strip is not None:
+            self._strip.lut = None if self._lut_identity else self._lut
+
     def setPixelColor(self, index, color_value):
         """
         Set a single pixel's color
@@ -99,14 +134,65 @@ class MPDotStar(DriverBase):
         :param color_value: 0xrrggbb
         :return:
         """
-        # self._strip.setPixelColor(index, color_value)
-        # Need to convert 0xrrggbb to (r,g,b)
-        r = (color_value >> 16) & 0xFF
-        g = (color_value >> 8) & 0xFF
-        b = color_value & 0xFF
         # This is here in case deep debugging is required. It is really slow.
-        # logger.debug(f"index: {index} rgb: {r} {g} {b}")
-        self._strip[index] = (r, g, b)
+        # logger.debug(f"index: {index} color: {hex(color_value)}")
+        self._strip.set_pixel_rgb_int(index, color_value)
+        self._dirty = True
+        return True
+
+    def setPixels(self, rgb_buf, start=0):
+        """
+        Set consecutive pixels from a packed r, g, b buffer
+        :param rgb_buf: A bytearray of 3 bytes per pixel (num_pixels * 3 for all pixels)
+        :param start: Index of the first pixel to be set
+        :return:
+        """
+        self._strip.set_rgb_buffer(start, rgb_buf)
+        self._dirty = True
+        return True
+
+    def clearPixels(self, start, count):
+        """
+        Clear (turn off) a range of pixels without showing them
+        :param start: Index of the first pixel to be cleared
+        :param count: Number of pixels to be cleared
+        :return:
+        """
+        self._strip.clear_range(start, count)
+        self._dirty = True
+        return True
+
+    def createPattern(self, colors):
+        """
+        Create a rotating frame pattern in DotStar buffer layout
+        (header byte followed by the colors in strip order)
+        :param colors: A sequence of 0xrrggbb values
+        :return: A RotatingFrame instance
+        """
+        red_offset, green_offset, blue_offset = self._strip.color_offsets
+        pattern = bytearray(len(colors) * 4)
+        offset = 0
+        for color_value in colors:
+            pattern[offset] = LED_HEADER
+            pattern[offset + red_offset] = (color_value >> 16) & 0xFF
+            pattern[offset + green_offset] = (color_value >> 8) & 0xFF
+            pattern[offset + blue_offset] = color_value & 0xFF
+            offset += 4
+        return RotatingFrame(pattern, 4)
+
+    def setPattern(self, pattern, start=0, count=None):
+        """
+        Set pixels from a rotating frame pattern starting at the
+        pattern's head
+        :param pattern: A RotatingFrame created by createPattern
+        :param start: Index of the first pixel to be set
+        :param count: Number of pixels to be set (default: all)
+        :return:
+        """
+        if count is None:
+            count = self._num_pixels
+        pattern.copy_into(self._strip.buf, START_HEADER_SIZE + (start * 4), count)
+        self._dirty = True
         return True
 
     def clear(self):
@@ -114,8 +200,8 @@ class MPDotStar(DriverBase):
         Clear (turn off) all pixels in the string
         :return:
         """
-        for i in range(self._num_pixels):
-            self.setPixelColor(i, 0)
+        self._strip.clear()
+        self._dirty = True
         self.show()
         return True
 
@@ -129,20 +215,6 @@ class MPDotStar(DriverBase):
         self._strip = None
         return True
 
-    def color(self, r, g, b, gamma=False):
-        """
-        Create a composite RGB color value
-        :param r: 0-255
-        :param g: 0-255
-        :param b: 0-255
-        :param gamma: If True, gamma correction is applied.
-        :return:
-        """
-        # Note that this IS NOT the same order as the DotStar
-        if gamma:
-            return (MPDotStar._gamma8[r] << 16) | (MPDotStar._gamma8[g] << 8) | MPDotStar._gamma8[b]
-        return (r << 16) | (g << 8) | b
-
     @staticmethod
     def _pixel_order(order_str):
         """
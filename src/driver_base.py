@@ -13,6 +13,30 @@
 # LED driver base class - all things common to a driver
 #
 
+from .rotating_frame import RotatingFrame
+import time
+try:
+    import micropython
+except ImportError:
+    # CPython (host tools)
+    micropython = None
+
+
+# dst[i] = lut[src[i]] for the n bytes of src, once per shown frame
+if micropython is not None:
+    # Machine code with raw byte pointers
+    @micropython.viper
+    def _lut_copy(src, dst, lut, n: int):
+        s = ptr8(src)
+        d = ptr8(dst)
+        t = ptr8(lut)
+        for i in range(n):
+            d[i] = t[s[i]]
+else:
+    def _lut_copy(src, dst, lut, n):
+        dst[:n] = src.translate(lut)
+
+
 class DriverBase:
     """
     A device driver must implement each of the methods in this class.
@@ -45,12 +69,41 @@ class DriverBase:
         177, 180, 182, 184, 186, 189, 191, 193, 196, 198, 200, 203, 205, 208, 210, 213,
         215, 218, 220, 223, 225, 228, 231, 233, 236, 239, 241, 244, 247, 249, 252, 255]
 
+    #
+    # Byte position of the red, green and blue values within a pixel
+    # for each supported color order (0 is the first byte sent to the string).
+    #
+    _color_orders = {
+        "RGB": (0, 1, 2),
+        "RBG": (0, 2, 1),
+        "GRB": (1, 0, 2),
+        "GBR": (2, 0, 1),
+        "BRG": (1, 2, 0),
+        "BGR": (2, 1, 0),
+    }
+
     def __init__(self):
         self._strip = None
         self._order = 'RGB'
+        self._offsets = DriverBase._color_orders["RGB"]
         self._datapin = 10
         self._clockpin = 11
         self._num_pixels = 1
+        # Driver level gamma correction and brightness (0-255) are folded
+        # into a single table that is applied to the output buffer by show()
+        self._gamma = False
+        self._level = 255
+        self._lut = bytearray(256)
+        self._lut_identity = True
+        # Frame tracking. show() skips a frame when nothing was set since the
+        # last transmission or the frame bytes equal the last transmitted frame.
+        self._dirty = True
+        self._refresh = True
+        self._last_frame = None
+        # Called by show() (see add_frame_hook)
+        self._frame_hooks = ()
+        self._show_start_us = 0
+        self._build_lut()
 
     @property
     def name(self):
@@ -66,24 +119,269 @@ class DriverBase:
 
     def open(self, num_pixels, datapin=10, clockpin=11, order='rgb'):
         self._numpixels = num_pixels
+        self._compile_order(order)
         return self._begin()
 
+    def _compile_order(self, order):
+        """
+        Compile a color order string into the byte offsets used when a
+        color value is written into the pixel buffer. This is done once, at
+        open time, so no order comparisons are made as pixels are set.
+        :param order: RGB, RBG, GRB, GBR, BRG, BGR (case insensitive)
+        :return: The (red, green, blue) byte offset triple
+        """
+        self._order = order.upper()
+        # Default or unrecognized order is RGB
+        self._offsets = DriverBase._color_orders.get(self._order, DriverBase._color_orders["RGB"])
+        return self._offsets
+
     def _begin(self):
         return True
 
-    def show(self):
+    def show(self, force=False):
+        """
+        Send the frame to the string. Drivers implement _show(). When
+        there are frame hooks, each one is called with the time in
+        microseconds spent in _show().
+        :param force: True to send the frame even if it has not changed
+        :return:
+        """
+        hooks = self._frame_hooks
+        if not hooks:
+            return self._show(force)
+        start = time.ticks_us()
+        result = self._show(force)
+        show_us = time.ticks_diff(time.ticks_us(), start)
+        for hook in hooks:
+            hook(show_us)
+        return result
+
+    def _show(self, force):
+        return True
+
+    def show_start(self, force=False):
+        """
+        Start sending the frame. Drivers that send in the background
+        (e.g. DMA) return while the frame is being sent, so another
+        output can send at the same time. The others send it now.
+        show_wait() must be called before the frame is changed.
+        :param force: True to send the frame even if it has not changed
+        :return:
+        """
+        if self._frame_hooks:
+            self._show_start_us = time.ticks_us()
+        return self._show_start(force)
+
+    def show_wait(self):
+        """
+        Wait for the frame started by show_start() to be sent. Frame hooks
+        are called with the time since show_start().
+        :return: None
+        """
+        self._wait_sent()
+        hooks = self._frame_hooks
+        if hooks:
+            show_us = time.ticks_diff(time.ticks_us(), self._show_start_us)
+            for hook in hooks:
+                hook(show_us)
+
+    @property
+    def sends_in_background(self):
+        """
+        Answers the question: does show_start() return before the frame is sent?
+        :return:
+        """
+        return False
+
+    def _show_start(self, force):
+        return self._show(force)
+
+    def _wait_sent(self):
+        return True
+
+    def add_frame_hook(self, hook):
+        """
+        Add a function to be called after each show() (e.g. a profiler)
+        :param hook: A function that takes the show time in microseconds
+        :return: None
+        """
+        self._frame_hooks = self._frame_hooks + (hook,)
+
+    def remove_frame_hook(self, hook):
+        """
+        Remove a function added by add_frame_hook()
+        :param hook: The function
+        :return: None
+        """
+        self._frame_hooks = tuple(h for h in self._frame_hooks if h != hook)
+
+    def _frame_changed(self, frame, force=False):
+        """
+        Answers the question: does this frame need to be transmitted?
+        The frame is remembered as the last transmitted frame when it does.
+        :param frame: The driver's frame buffer (pixel values before gamma/brightness)
+        :param force: True to transmit regardless of changes
+        :return: True if the frame should be sent to the string
+        """
+        if self._last_frame is None or len(self._last_frame) != len(frame):
+            self._last_frame = bytearray(len(frame))
+            self._refresh = True
+        if not (force or self._refresh):
+            if not self._dirty or frame == self._last_frame:
+                self._dirty = False
+                return False
+        self._dirty = False
+        self._refresh = False
+        self._last_frame[:] = frame
         return True
 
     @property
     def numPixels(self):
         return self._numpixels
 
+    @property
+    def frameBuffer(self):
+        """
+        Returns the driver's frame buffer (in driver layout) or None if
+        the driver does not have one. Used for frame recording.
+        :return:
+        """
+        return None
+
     def setBrightness(self, brightness):
         return True
 
     def setPixelColor(self, index, color_value):
         return True
 
+    @property
+    def supports_fade(self):
+        """
+        Answers the question: does fade_to() run a native fade?
+        :return:
+        """
+        return False
+
+    def fade_to(self, rgb16, duration_ms):
+        """
+        Start a native fade to a color. Drivers that can fade on their
+        own (e.g. from a timer) override this and supports_fade.
+        :param rgb16: Target color (r, g, b), 0-65535 per channel
+        :param duration_ms: Length of the fade in milliseconds
+        :return: False if the driver does not support native fades
+        """
+        return False
+
+    @property
+    def fading(self):
+        return False
+
+    def cancel_fade(self):
+        return True
+
+    def setPixels(self, rgb_buf, start=0):
+        """
+        Set consecutive pixels from a packed r, g, b buffer
+        :param rgb_buf: A bytearray of 3 bytes per pixel (numPixels * 3 for all pixels)
+        :param start: Index of the first pixel to be set
+        :return:
+        """
+        offset = 0
+        for i in range(start, start + (len(rgb_buf) // 3)):
+            self.setPixelColor(i, (rgb_buf[offset] << 16) | (rgb_buf[offset + 1] << 8) | rgb_buf[offset + 2])
+            offset += 3
+        return True
+
+    def clearPixels(self, start, count):
+        """
+        Clear (turn off) a range of pixels without showing them
+        :param start: Index of the first pixel to be cleared
+        :param count: Number of pixels to be cleared
+        :return:
+        """
+        for i in range(start, start + count):
+            self.setPixelColor(i, 0)
+        return True
+
+    def createPattern(self, colors):
+        """
+        Create a rotating frame pattern (see RotatingFrame) in the
+        layout used by this driver's frame buffer
+        :param colors: A sequence of 0xrrggbb values
+        :return: A RotatingFrame instance
+        """
+        # Generic layout is packed r, g, b
+        pattern = bytearray(len(colors) * 3)
+        offset = 0
+        for color_value in colors:
+            pattern[offset] = (color_value >> 16) & 0xFF
+            pattern[offset + 1] = (color_value >> 8) & 0xFF
+            pattern[offset + 2] = color_value & 0xFF
+            offset += 3
+        return RotatingFrame(pattern, 3)
+
+    def setPattern(self, pattern, start=0, count=None):
+        """
+        Set pixels from a rotating frame pattern starting at the
+        pattern's head. Drivers with a frame buffer copy the window
+        with slice copies.
+        :param pattern: A RotatingFrame created by createPattern
+        :param start: Index of the first pixel to be set
+        :param count: Number of pixels to be set (default: all)
+        :return:
+        """
+        if count is None:
+            count = self.numPixels
+        p = pattern.pattern
+        length = pattern.length
+        k = pattern.head
+        for i in range(start, start + count):
+            offset = k * 3
+            self.setPixelColor(i, (p[offset] << 16) | (p[offset + 1] << 8) | p[offset + 2])
+            k += 1
+            if k >= length:
+                k = 0
+        return True
+
+    def setGamma(self, gamma):
+        """
+        Turn driver level gamma correction on or off
+        :param gamma: True or False
+        :return:
+        """
+        self._gamma = bool(gamma)
+        self._build_lut()
+        return True
+
+    @property
+    def gamma(self):
+        return self._gamma
+
+    def _build_lut(self):
+        """
+        Fold gamma correction and brightness into one 256 entry table.
+        This is only done when the gamma mode or brightness changes.
+        :return: None
+        """
+        lut = self._lut
+        level = self._level
+        table = DriverBase._gamma8 if self._gamma else range(256)
+        for v in range(256):
+            lut[v] = min(int((table[v] * level) / 255), 255)
+        self._lut_identity = (not self._gamma) and level == 255
+        # The output changes even if the frame does not
+        self._refresh = True
+
+    def _apply_lut(self, src, dst):
+        """
+        Pass every byte of a frame through the gamma/brightness table
+        into the output buffer.
+        :param src: Frame buffer
+        :param dst: Output buffer, same size as src
+        :return: None
+        """
+        _lut_copy(src, dst, self._lut, len(src))
+
     def clear(self):
         return True
 
@@ -95,19 +393,16 @@ class DriverBase:
         return True
 
     def color(self, r, g, b, gamma=False):
-        if self._order == "GRB":
-            if gamma:
-                return (DriverBase._gamma8[g] << 16) | (DriverBase._gamma8[r] << 8) | DriverBase._gamma8[b]
-            return (g << 16) | (r << 8) | b
-        elif self._order == "RGB":
-            if gamma:
-                return (DriverBase._gamma8[r] << 16) | (DriverBase._gamma8[g] << 8) | DriverBase._gamma8[b]
-            return (r << 16) | (g << 8) | b
-        elif self._order == "BGR":
-            if gamma:
-                return (DriverBase._gamma8[b] << 16) | (DriverBase._gamma8[g] << 8) | DriverBase._gamma8[r]
-            return (b << 16) | (g << 8) | r
-        # Default
+        """
+        Create a composite RGB color value. The string's color order
+        is applied by the driver when the value is written to its buffer.
+        :param r: 0-255
+        :param g: 0-255
+        :param b: 0-255
+        :param gamma: If True, gamma correction is applied.
+        :return: 24-bit color value 0xRRGGBB
+        """
         if gamma:
-            return (DriverBase._gamma8[r] << 16) | (DriverBase._gamma8[g] << 8) | DriverBase._gamma8[b]
+            g8 = DriverBase._gamma8
+            return (g8[r] << 16) | (g8[g] << 8) | g8[b]
         return (r << 16) | (g << 8) | b
@@ -0,0 +1,104 @@
+#
+# driver_benchmark.py - time driver buffer operations on the Pico
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# The drivers' own clear() methods are timed against the per-pixel
+# code they replaced. show() is replaced by a no-op on the driver
+# instances, so nothing is sent and no LED string needs to be attached.
+#
+
+
+import gc
+import time
+from src.ws281x_driver import WS281XDriver
+from src.dotstar_driver import MPDotStar
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+# String lengths to be timed
+BENCHMARK_PIXELS = [300, 1000]
+# Number of times each operation is repeated
+BENCHMARK_PASSES = 10
+
+
+def _time_us(func, passes=BENCHMARK_PASSES):
+    """
+    Time a function
+    :param func: The function to be timed
+    :param passes: Number of times the function is called
+    :return: Average time in microseconds per call
+    """
+    gc.collect()
+    start = time.ticks_us()
+    for i in range(passes):
+        func()
+    return time.ticks_diff(time.ticks_us(), start) // passes
+
+
+def _no_show(force=False):
+    return True
+
+
+def _benchmark_ws281x_clear(pixels, datapin):
+    """
+    Compare WS281XDriver.clear() against the byte by byte clear it replaced
+    :param pixels: Number of pixels
+    :param datapin: Data pin for the driver (nothing is written)
+    :return: None
+    """
+    driver = WS281XDriver()
+    driver.open(pixels, datapin=datapin)
+    driver.show = _no_show
+    frame = driver.frameBuffer
+
+    def old_clear():
+        for i in range(len(frame)):
+            frame[i] = 0
+        driver.show()
+
+    logger.info(f"WS281X {pixels} clear old: {_time_us(old_clear)} us")
+    logger.info(f"WS281X {pixels} clear new: {_time_us(driver.clear)} us")
+    driver.close()
+
+
+def _benchmark_dotstar_clear(pixels):
+    """
+    Compare MPDotStar.clear() against the per-pixel clear it replaced
+    :param pixels: Number of pixels
+    :return: None
+    """
+    # Without an SPI instance the strip does not transmit
+    driver = MPDotStar()
+    driver.open(None, pixels)
+    driver.show = _no_show
+
+    def old_clear():
+        for i in range(pixels):
+            driver.setPixelColor(i, 0)
+        driver.show()
+
+    logger.info(f"DotStar {pixels} clear old: {_time_us(old_clear)} us")
+    logger.info(f"DotStar {pixels} clear new: {_time_us(driver.clear)} us")
+    del driver
+
+
+def run_driver_benchmark(datapin=0):
+    """
+    Run all driver benchmarks and log the results
+    :param datapin: Pin used for the NeoPixel instance
+    :return: None
+    """
+    logger.info("Driver benchmark started")
+    for pixels in BENCHMARK_PIXELS:
+        _benchmark_ws281x_clear(pixels, datapin)
+        _benchmark_dotstar_clear(pixels)
+    gc.collect()
+    logger.info("Driver benchmark ended")
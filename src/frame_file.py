@@ -0,0 +1,276 @@
+#
+# frame_file.py - recorded (baked) LED frame file format
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# A frame file holds a fixed rate sequence of frames for a given number
+# of pixels. Colors are raw script colors (before gamma and brightness).
+# All values are little endian.
+#
+# Header (16 bytes)
+#   4 bytes  magic "LEDF"
+#   u8       version
+#   u8       flags (0)
+#   u16      pixel count
+#   u16      frame period in milliseconds
+#   u32      frame count
+#   u16      largest record payload in bytes
+#
+# Each frame is one record
+#   u8       record type
+#   u16      payload length
+#   payload
+#
+# Record types
+#   REPEAT  The frame is the same as the previous frame (no payload)
+#   KEY     The whole frame, run length encoded: [u8 count, r, g, b]...
+#   DELTA   Changes to the previous frame: [u16 skip, u8 count, count * (r, g, b)]...
+#           skip is the number of unchanged pixels before the changed span.
+#
+
+import struct
+
+
+MAGIC = b"LEDF"
+VERSION = 1
+HEADER_FORMAT = "<4sBBHHIH"
+HEADER_SIZE = 16
+RECORD_HEADER_FORMAT = "<BH"
+RECORD_HEADER_SIZE = 3
+
+RECORD_REPEAT = 0
+RECORD_KEY = 1
+RECORD_DELTA = 2
+
+
+def encode_key(frame):
+    """
+    Run length encode a whole frame
+    :param frame: Packed r, g, b frame
+    :return: KEY record payload
+    """
+    payload = bytearray()
+    pixels = len(frame) // 3
+    px = 0
+    while px < pixels:
+        offset = px * 3
+        rgb = frame[offset:offset + 3]
+        count = 1
+        while px + count < pixels and count < 255 and \
+                frame[offset + count * 3:offset + count * 3 + 3] == rgb:
+            count += 1
+        payload.append(count)
+        payload.extend(rgb)
+        px += count
+    return payload
+
+
+def encode_delta(previous, frame):
+    """
+    Encode the changes from one frame to the next
+    :param previous: Packed r, g, b previous frame
+    :param frame: Packed r, g, b frame
+    :return: DELTA record payload
+    """
+    payload = bytearray()
+    pixels = len(frame) // 3
+    px = 0
+    skip = 0
+    while px < pixels:
+        offset = px * 3
+        if frame[offset:offset + 3] == previous[offset:offset + 3]:
+            skip += 1
+            px += 1
+            continue
+        # A changed span, up to 255 pixels
+        count = 1
+        while px + count < pixels and count < 255:
+            end = (px + count) * 3
+            if frame[end:end + 3] == previous[end:end + 3]:
+                break
+            count += 1
+        # Skips larger than a u16 are split with empty spans
+        while skip > 0xFFFF:
+            payload.extend(struct.pack("<HB", 0xFFFF, 0))
+            skip -= 0xFFFF
+        payload.extend(struct.pack("<HB", skip, count))
+        payload.extend(frame[offset:offset + count * 3])
+        skip = 0
+        px += count
+    return payload
+
+
+class FrameFileWriter:
+    """
+    Writes frames to a frame file. Each frame is stored as the smallest
+    of a REPEAT, KEY or DELTA record.
+    """
+    def __init__(self, stream, pixels, period_ms):
+        """
+        Start a frame file
+        :param stream: A binary stream opened for writing (must support seek)
+        :param pixels: Number of pixels per frame
+        :param period_ms: Time between frames in milliseconds
+        """
+        self._stream = stream
+        self.pixels = pixels
+        self.period_ms = period_ms
+        self.frame_count = 0
+        self.max_payload = 0
+        self.bytes_written = 0
+        self._previous = None
+        self._write_header()
+
+    def _write_header(self):
+        self._stream.seek(0)
+        self._stream.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0, self.pixels,
+                                       self.period_ms, self.frame_count, self.max_payload))
+
+    def write_frame(self, frame):
+        """
+        Append a frame
+        :param frame: Packed r, g, b frame of pixels * 3 bytes
+        :return: The record type that was written
+        """
+        if self._previous is not None and frame == self._previous:
+            record_type = RECORD_REPEAT
+            payload = b""
+        else:
+            record_type = RECORD_KEY
+            payload = encode_key(frame)
+            if self._previous is not None:
+                delta = encode_delta(self._previous, frame)
+                if len(delta) < len(payload):
+                    record_type = RECORD_DELTA
+                    payload = delta
+            self._previous = bytes(frame)
+
+        self._stream.write(struct.pack(RECORD_HEADER_FORMAT, record_type, len(payload)))
+        self._stream.write(payload)
+        self.frame_count += 1
+        self.max_payload = max(self.max_payload, len(payload))
+        self.bytes_written += RECORD_HEADER_SIZE + len(payload)
+        return record_type
+
+    def close(self):
+        """
+        Finish the file by updating the header
+        :return: None
+        """
+        self._write_header()
+        self._stream.seek(0, 2)
+
+
+class FrameFileReader:
+    """
+    Reads frames from a frame file one record at a time. The record
+    payload is read into a buffer allocated once (sized by the header)
+    and decoded into a packed r, g, b frame that is also allocated once.
+
+    MicroPython streams take a byte count in readinto(buf, nbytes), so a
+    record is read into the start of the payload buffer without a slice.
+    Other streams (CPython, for host tools) read into a memoryview slice.
+    """
+    def __init__(self, path):
+        """
+        Open a frame file and read its header
+        :param path: Frame file path
+        """
+        self._file = open(path, "rb")
+        header = bytearray(HEADER_SIZE)
+        try:
+            length = self._file.readinto(header, HEADER_SIZE)
+            self._sized_readinto = True
+        except TypeError:
+            length = self._file.readinto(header)
+            self._sized_readinto = False
+        if length != HEADER_SIZE:
+            self._file.close()
+            raise ValueError(f"{path} is not a frame file")
+        magic, version, flags, pixels, period_ms, frame_count, max_payload = \
+            struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC or version != VERSION:
+            self._file.close()
+            raise ValueError(f"{path} is not a version {VERSION} frame file")
+        self.pixels = pixels
+        self.period_ms = period_ms
+        self.frame_count = frame_count
+        self.max_payload = max_payload
+
+        # The current frame (packed r, g, b)
+        self.frame = bytearray(pixels * 3)
+        self._record_header = bytearray(RECORD_HEADER_SIZE)
+        self._payload = bytearray(max(max_payload, 1))
+        self._payload_mv = memoryview(self._payload)
+
+    def rewind(self):
+        """
+        Go back to the first frame
+        :return: None
+        """
+        self._file.seek(HEADER_SIZE)
+
+    def read_frame(self):
+        """
+        Read the next frame into frame
+        :return: False at the end of the file
+        """
+        record_header = self._record_header
+        if self._file.readinto(record_header) != RECORD_HEADER_SIZE:
+            return False
+        record_type = record_header[0]
+        length = record_header[1] | (record_header[2] << 8)
+        if length > len(self._payload):
+            raise ValueError("Frame record is larger than the header allows")
+        if length:
+            if self._sized_readinto:
+                if self._file.readinto(self._payload, length) != length:
+                    return False
+            elif self._file.readinto(self._payload_mv[:length]) != length:
+                return False
+
+        if record_type == RECORD_KEY:
+            self._decode_key(length)
+        elif record_type == RECORD_DELTA:
+            self._decode_delta(length)
+        # RECORD_REPEAT leaves the frame as it is
+        return True
+
+    def _decode_key(self, length):
+        frame = self.frame
+        payload = self._payload
+        offset = 0
+        for q in range(0, length, 4):
+            r = payload[q + 1]
+            g = payload[q + 2]
+            b = payload[q + 3]
+            for px in range(payload[q]):
+                frame[offset] = r
+                frame[offset + 1] = g
+                frame[offset + 2] = b
+                offset += 3
+
+    def _decode_delta(self, length):
+        frame = self.frame
+        payload = self._payload
+        payload_mv = self._payload_mv
+        offset = 0
+        q = 0
+        while q < length:
+            offset += (payload[q] | (payload[q + 1] << 8)) * 3
+            count = payload[q + 2] * 3
+            q += 3
+            # The view slice is a small object, the span is not copied twice
+            frame[offset:offset + count] = payload_mv[q:q + count]
+            offset += count
+            q += count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,199 @@
+#
+# frame_telemetry.py - frame rate and frame timing counters
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+import time
+from array import array
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+
+class FrameTelemetry:
+    """
+    Rolling frame timing counters. The driver calls frame() after every
+    show() (it is added as a frame hook) and the script CPU calls
+    wait_started()/wait_ended() around the wait between frames. Each
+    frame interval is split into
+      show    time spent inside the driver's show() (transmit)
+      wait    time the script slept
+      render  everything else (computing and setting pixels)
+    A frame is late when its interval is longer than the wait the
+    script asked for plus the tolerance. Frame intervals and show times
+    are also counted in fixed size histograms. Counters cover the time
+    since the last reset().
+    """
+    # Frame interval histogram: 2ms bins, the last bin counts everything longer
+    INTERVAL_BIN_MS = 2
+    INTERVAL_BINS = 32
+    # Show time histogram: 0.5ms bins, the last bin counts everything longer
+    SHOW_BIN_US = 500
+    SHOW_BINS = 32
+
+    def __init__(self, status_interval_ms=0, late_tolerance_ms=2):
+        """
+        Create frame telemetry
+        :param status_interval_ms: How often status_due() is True (0 for never)
+        :param late_tolerance_ms: How much longer than the requested wait
+        a frame interval can be before the frame is late
+        """
+        self._status_interval_ms = status_interval_ms
+        self._late_tolerance_us = int(late_tolerance_ms * 1000)
+        self.interval_histogram = array("I", [0] * FrameTelemetry.INTERVAL_BINS)
+        self.show_histogram = array("I", [0] * FrameTelemetry.SHOW_BINS)
+        self.reset()
+
+    def reset(self):
+        """
+        Zero all counters and start a new window
+        :return: None
+        """
+        self.frames = 0
+        self.intervals = 0
+        self.late_frames = 0
+        self.show_us = 0
+        self.render_us = 0
+        self.wait_us = 0
+        self.worst_interval_us = 0
+        self.worst_show_us = 0
+        for i in range(FrameTelemetry.INTERVAL_BINS):
+            self.interval_histogram[i] = 0
+        for i in range(FrameTelemetry.SHOW_BINS):
+            self.show_histogram[i] = 0
+        self._window_start = time.ticks_ms()
+        self.new_sequence()
+
+    def new_sequence(self):
+        """
+        The next frame starts a new sequence of frames (e.g. a new
+        statement). The time since the last frame is not counted.
+        :return: None
+        """
+        self._last_frame_us = None
+        self._target_us = 0
+        self._slept_us = 0
+
+    def wait_started(self, wait_ms):
+        """
+        The script is about to wait between frames
+        :param wait_ms: The requested wait (the intended frame period)
+        :return: None
+        """
+        self._target_us = int(wait_ms * 1000)
+        self._wait_start = time.ticks_us()
+
+    def wait_ended(self):
+        self._slept_us += time.ticks_diff(time.ticks_us(), self._wait_start)
+
+    def frame(self, show_us):
+        """
+        Frame hook. Called by the driver after each show().
+        :param show_us: Time spent in show()
+        :return: None
+        """
+        now = time.ticks_us()
+        self.frames += 1
+        self.show_us += show_us
+        if show_us > self.worst_show_us:
+            self.worst_show_us = show_us
+        self.show_histogram[min(show_us // FrameTelemetry.SHOW_BIN_US, FrameTelemetry.SHOW_BINS - 1)] += 1
+
+        if self._last_frame_us is not None:
+            interval = time.ticks_diff(now, self._last_frame_us)
+            self.intervals += 1
+            self.wait_us += self._slept_us
+            self.render_us += max(interval - show_us - self._slept_us, 0)
+            if interval > self.worst_interval_us:
+                self.worst_interval_us = interval
+            self.interval_histogram[min(interval // (FrameTelemetry.INTERVAL_BIN_MS * 1000),
+                                        FrameTelemetry.INTERVAL_BINS - 1)] += 1
+            if self._target_us and interval > self._target_us + self._late_tolerance_us:
+                self.late_frames += 1
+        self._slept_us = 0
+        self._last_frame_us = now
+
+    @property
+    def elapsed_ms(self):
+        """
+        Returns the length of the current window
+        :return:
+        """
+        return time.ticks_diff(time.ticks_ms(), self._window_start)
+
+    @property
+    def fps(self):
+        elapsed = self.elapsed_ms
+        if elapsed <= 0:
+            return 0.0
+        return (self.frames * 1000.0) / elapsed
+
+    def percentile_interval_ms(self, percent):
+        """
+        Estimate a frame interval percentile from the histogram
+        :param percent: 0-100
+        :return: The upper edge of the histogram bin in milliseconds
+        """
+        target = (self.intervals * percent) // 100
+        count = 0
+        for i in range(FrameTelemetry.INTERVAL_BINS):
+            count += self.interval_histogram[i]
+            if count > target:
+                return (i + 1) * FrameTelemetry.INTERVAL_BIN_MS
+        return FrameTelemetry.INTERVAL_BINS * FrameTelemetry.INTERVAL_BIN_MS
+
+    def status_due(self):
+        """
+        Answers the question: is it time for a periodic status report?
+        :return: True when the window is at least the status interval long
+        """
+        return self._status_interval_ms > 0 and self.elapsed_ms >= self._status_interval_ms
+
+    def status(self):
+        """
+        Returns the counters as a dict
+        :return:
+        """
+        frames = max(self.frames, 1)
+        intervals = max(self.intervals, 1)
+        return {
+            "frames": self.frames,
+            "fps": self.fps,
+            "late": self.late_frames,
+            "show_ms": self.show_us / frames / 1000.0,
+            "render_ms": self.render_us / intervals / 1000.0,
+            "wait_ms": self.wait_us / intervals / 1000.0,
+            "worst_interval_ms": self.worst_interval_us / 1000.0,
+            "worst_show_ms": self.worst_show_us / 1000.0,
+            "p95_interval_ms": self.percentile_interval_ms(95),
+        }
+
+    def status_lines(self):
+        """
+        Returns the status as short lines (20 characters fit an LCD row)
+        :return: A list of strings
+        """
+        s = self.status()
+        return [
+            f"fps {s['fps']:.1f} late {s['late']}",
+            f"show {s['show_ms']:.1f} rnd {s['render_ms']:.1f}",
+            f"worst {s['worst_interval_ms']:.0f}ms",
+        ]
+
+    def log_status(self, reset=True):
+        """
+        Log the status lines
+        :param reset: True to start a new window
+        :return: None
+        """
+        for line in self.status_lines():
+            logger.info(line)
+        if reset:
+            self.reset()
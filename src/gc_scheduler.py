@@ -0,0 +1,118 @@
+#
+# gc_scheduler.py - run garbage collections between animation statements
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+import gc
+import time
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+# These are MicroPython only
+_mem_alloc = getattr(gc, "mem_alloc", None)
+_mem_free = getattr(gc, "mem_free", None)
+_threshold = getattr(gc, "threshold", None)
+
+
+class GCScheduler:
+    """
+    Moves garbage collection out of animation frame loops. While a
+    script runs, the automatic allocation threshold is turned off
+    (gc.threshold(-1)), so the collector only runs on its own when the
+    heap is full. The script CPU calls boundary() before each algorithm
+    statement and after each loop foot, and a collection is done there
+    when enough has been allocated since the last one. The collector is
+    never disabled outright because a full heap would then raise
+    MemoryError instead of collecting. The zones of a string share a
+    scheduler, so start() and stop() nest.
+    """
+    # Collect at a boundary when at least this many bytes were allocated
+    MIN_ALLOC_BYTES = 2048
+
+    def __init__(self, min_alloc_bytes=MIN_ALLOC_BYTES):
+        """
+        Create a scheduler
+        :param min_alloc_bytes: Allocation since the last collection
+        that makes a collection worthwhile
+        """
+        self._min_alloc_bytes = min_alloc_bytes
+        self._saved_threshold = None
+        self._users = 0
+        self._alloc_after_collect = 0
+        self.collections = 0
+        self.total_pause_us = 0
+        self.max_pause_us = 0
+
+    def start(self):
+        """
+        Take over the collector for a script run
+        :return: None
+        """
+        self._users += 1
+        if self._users > 1:
+            return
+        if _threshold is not None:
+            self._saved_threshold = _threshold()
+            _threshold(-1)
+        self.collect()
+
+    def stop(self):
+        """
+        Give the collector back and report the pauses
+        :return: None
+        """
+        self._users -= 1
+        if self._users > 0:
+            return
+        if _threshold is not None and self._saved_threshold is not None:
+            _threshold(self._saved_threshold)
+            self._saved_threshold = None
+        self.report()
+
+    def boundary(self):
+        """
+        A statement boundary. Collect if enough has been allocated.
+        :return: True if a collection was done
+        """
+        if _mem_alloc is not None and \
+                _mem_alloc() - self._alloc_after_collect < self._min_alloc_bytes:
+            return False
+        self.collect()
+        return True
+
+    def collect(self):
+        """
+        Do a timed collection
+        :return: The pause in microseconds
+        """
+        start = time.ticks_us()
+        gc.collect()
+        pause = time.ticks_diff(time.ticks_us(), start)
+        self.collections += 1
+        self.total_pause_us += pause
+        if pause > self.max_pause_us:
+            self.max_pause_us = pause
+        if _mem_alloc is not None:
+            self._alloc_after_collect = _mem_alloc()
+        return pause
+
+    def report(self):
+        """
+        Log the collection pauses
+        :return: None
+        """
+        if self.collections == 0:
+            return
+        mean_ms = self.total_pause_us / self.collections / 1000.0
+        logger.info(f"GC: {self.collections} collections, mean {mean_ms:.1f}ms, "
+                    f"max {self.max_pause_us / 1000.0:.1f}ms")
+        if _mem_free is not None:
+            logger.info(f"GC: {_mem_free()} bytes free")
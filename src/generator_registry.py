@@ -0,0 +1,47 @@
+#
+# generator_registry.py - pixel generators available to the generator statement
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+from src.color77_generator import Color77PixelGenerator
+
+
+# Generator name (as used in a script) to PixelGenerator subclass
+_generators = {}
+
+
+def register_generator(name, generator_class):
+    """
+    Make a pixel generator available to scripts
+    :param name: The name used in the generator statement (lower case)
+    :param generator_class: A PixelGenerator subclass
+    :return: None
+    """
+    _generators[name.lower()] = generator_class
+
+
+def get_generator(name):
+    """
+    Look up a registered pixel generator
+    :param name: Generator name
+    :return: The PixelGenerator subclass or None
+    """
+    return _generators.get(name.lower())
+
+
+def generator_names():
+    """
+    Returns the names of all registered generators
+    :return:
+    """
+    return list(_generators.keys())
+
+
+# Built in generators
+register_generator("color77", Color77PixelGenerator)
@@ -0,0 +1,102 @@
+#
+# idle_wait.py - long, low power waits for the script CPU
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# Under CPython, put tools/host on sys.path for the machine stand-in.
+#
+
+import time
+import machine
+from machine import Pin
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+# Not every port/firmware has lightsleep
+_lightsleep = getattr(machine, "lightsleep", None)
+
+
+class IdleWait:
+    """
+    Waits that last seconds to hours (do-at, pause). The end of the wait
+    is computed once as a time.time() value and the wait sleeps in long
+    chunks, checking the terminate event between chunks.
+
+    With lightsleep, the board sleeps with machine.lightsleep(), which
+    also stops the task thread that polls the terminate button. A rising
+    edge on the button pin wakes the board and keeps it awake (sleeping
+    in short chunks) long enough for the button task to time a hold click.
+    """
+    # Longest sleep between terminate checks
+    SLEEP_CHUNK_MS = 1000
+    LIGHTSLEEP_CHUNK_MS = 60 * 1000
+    # How long to stay awake after the button wakes the board
+    BUTTON_AWAKE_MS = 3000
+    BUTTON_POLL_MS = 100
+
+    def __init__(self, terminate_event, lightsleep=False, wake_pin=None):
+        """
+        Create an idle waiter
+        :param terminate_event: Tested between sleeps to end a wait early
+        :param lightsleep: True to sleep with machine.lightsleep()
+        :param wake_pin: The terminate button pin, which wakes a lightsleep
+        """
+        self._terminate_event = terminate_event
+        self._lightsleep = lightsleep and _lightsleep is not None
+        if lightsleep and _lightsleep is None:
+            logger.warning("machine.lightsleep is not available")
+        self._wake_pin = wake_pin
+        self._awake_until = time.ticks_ms()
+
+    def _button_irq(self, pin):
+        """
+        The terminate button was pressed during a wait
+        :param pin: The button pin
+        :return: None
+        """
+        self._awake_until = time.ticks_add(time.ticks_ms(), IdleWait.BUTTON_AWAKE_MS)
+
+    def wait_for(self, seconds):
+        """
+        Wait for a number of seconds
+        :param seconds: Length of the wait
+        :return: True if the wait ended. False if it was terminated.
+        """
+        return self.wait_until(time.time() + seconds)
+
+    def wait_until(self, end_time):
+        """
+        Wait until a time arrives
+        :param end_time: A time.time() value
+        :return: True if the wait ended. False if it was terminated.
+        """
+        button = None
+        if self._lightsleep and self._wake_pin is not None:
+            button = Pin(self._wake_pin, Pin.IN, Pin.PULL_DOWN)
+            button.irq(handler=self._button_irq, trigger=Pin.IRQ_RISING)
+
+        ended = False
+        try:
+            while not self._terminate_event.is_set():
+                remaining_ms = int((end_time - time.time()) * 1000)
+                if remaining_ms <= 0:
+                    ended = True
+                    break
+                if not self._lightsleep:
+                    time.sleep(min(remaining_ms, IdleWait.SLEEP_CHUNK_MS) / 1000.0)
+                elif time.ticks_diff(self._awake_until, time.ticks_ms()) > 0:
+                    # Awake so the button task can see the button
+                    time.sleep(min(remaining_ms, IdleWait.BUTTON_POLL_MS) / 1000.0)
+                else:
+                    _lightsleep(min(remaining_ms, IdleWait.LIGHTSLEEP_CHUNK_MS))
+        finally:
+            if button is not None:
+                button.irq(handler=None)
+        return ended
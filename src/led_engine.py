@@ -13,7 +13,15 @@
 from . import script_vm
 from . import script_compiler
 from . import script_cpu_led
+from .script_profiler import ScriptProfiler
+from .frame_telemetry import FrameTelemetry
+from .gc_scheduler import GCScheduler
+from .idle_wait import IdleWait
+from .segment_driver import SegmentDriver
+from .zone_scheduler import ZoneScheduler
 import mp_logging as logging
+import gc
+import time
 from push_button import PushButton
 from src.configuration import Configuration
 import sys
@@ -29,10 +37,23 @@ class TerminateEvent:
     def __init__(self):
         self._terminate_flag = False
         self._terminated = False
+        # A calendar script change ends the script like the terminate button
+        self._switch_time = None
+        self._switch_flag = False
         # Push button for terminating LED app
         config = Configuration.get_configuration()
         self._terminate_button = PushButton(pin=config[Configuration.CFG_TERMINATE_BUTTON_PIN])
 
+    def report_requested(self):
+        """
+        A short click of the terminate button asks for a report
+        :return: True if a short click was detected
+        """
+        if self._terminate_button.value() == PushButton.BUTTON_SHORT_CLICK:
+            self._terminate_button.reset()
+            return True
+        return False
+
     def is_set(self):
         # We're looking for a hold click (long click)
         button_state = self._terminate_button.value()
@@ -41,6 +62,26 @@ class TerminateEvent:
                 # Only log first detection
                 logger.info("The terminate button has been pressed")
             self.set_terminate_flag()
+        if self._switch_time is not None and not self._switch_flag and time.time() >= self._switch_time:
+            logger.info("A calendar script change is due")
+            self._switch_flag = True
+        return self._terminate_flag or self._switch_flag
+
+    def set_switch_time(self, switch_time):
+        """
+        Arm the event for the next script run
+        :param switch_time: The time.time() value at which the script
+        should end for a calendar change or None
+        :return: None
+        """
+        self._switch_time = switch_time
+        self._switch_flag = False
+        self._terminated = False
+
+    def is_switch_due(self):
+        return self._switch_flag
+
+    def is_terminate_requested(self):
         return self._terminate_flag
 
     def set_terminate_flag(self):
@@ -59,6 +100,8 @@ class LEDEngine:
         self.engine_thread = None
         self._vm = None
         self._compiler = None
+        # (output, start, stop, vm) for each zone of a multi-zone show
+        self._zones = []
         self._last_error = None
         self._dev = None
         self._terminate_signal = TerminateEvent()
@@ -73,18 +116,99 @@ class LEDEngine:
 
     def compile(self, script_file):
         # Create a VM instance
-        self._vm = script_vm.ScriptVM(script_file)
+        vm = script_vm.ScriptVM(script_file)
 
         # Compile the script (pass 1) of the current (main) thread
-        self._compiler = script_compiler.ScriptCompiler(self._vm)
-        rc = self._compiler.compile(script_file)
+        compiler = script_compiler.ScriptCompiler(vm)
+        rc = compiler.compile(script_file)
         if not rc:
-            self._last_error = self._compiler.last_error
+            self._last_error = compiler.last_error
             return rc
 
+        # A new script only replaces the current one when it compiles
+        self._vm = vm
+        self._compiler = compiler
+
         logger.info(f"Successfully compiled script {script_file}")
         return rc
 
+    def compile_zones(self, zones):
+        """
+        Compile the script of each zone of a string
+        :param zones: A list of {"start": first pixel, "stop": one past the
+        last pixel, "script_file": file}
+        :return: True if every zone's script compiled
+        """
+        self._zones = []
+        for zone in zones:
+            if not self._compile_zone(0, zone):
+                self._zones = []
+                return False
+        return True
+
+    def compile_outputs(self, outputs):
+        """
+        Compile the zone scripts of each output (LED string)
+        :param outputs: A list of output settings. Each has "zones" (see
+        compile_zones) or a "script_file" that runs on all of its "pixels".
+        :return: True if every zone's script compiled
+        """
+        self._zones = []
+        for output_index in range(len(outputs)):
+            output = outputs[output_index]
+            zones = output.get(Configuration.CFG_ZONES)
+            if zones is None:
+                zones = [{"start": 0, "stop": output.get(Configuration.CFG_PIXELS, 1),
+                          "script_file": output[Configuration.CFG_SCRIPT_FILE]}]
+            for zone in zones:
+                if not self._compile_zone(output_index, zone):
+                    self._zones = []
+                    return False
+        return True
+
+    def _compile_zone(self, output_index, zone):
+        """
+        Compile the script of a zone
+        :param output_index: The output (LED string) of the zone
+        :param zone: {"start": first pixel, "stop": one past the last pixel, "script_file": file}
+        :return: True if the script compiled
+        """
+        script_file = zone["script_file"]
+        vm = script_vm.ScriptVM(script_file)
+        compiler = script_compiler.ScriptCompiler(vm)
+        if not compiler.compile(script_file):
+            self._last_error = compiler.last_error
+            return False
+        self._zones.append((output_index, int(zone["start"]), int(zone["stop"]), vm))
+        logger.info(f"Successfully compiled zone {zone['start']}-{zone['stop']} script {script_file}")
+        return True
+
+    @staticmethod
+    def _create_profiler(vm):
+        """
+        Optional per statement profiling
+        :param vm: The VM to be profiled
+        :return: A ScriptProfiler or None
+        """
+        config = Configuration.get_configuration()
+        if config.get(Configuration.CFG_PROFILE, False):
+            logger.info("Statement profiling is on")
+            return ScriptProfiler(len(vm.stmts))
+        return None
+
+    @staticmethod
+    def _create_telemetry():
+        """
+        Optional frame timing telemetry, logged every telemetry_interval seconds
+        :return: A FrameTelemetry or None
+        """
+        config = Configuration.get_configuration()
+        if config.get(Configuration.CFG_TELEMETRY_INTERVAL, 0):
+            logger.info("Frame telemetry is on")
+            return FrameTelemetry(
+                status_interval_ms=int(float(config[Configuration.CFG_TELEMETRY_INTERVAL]) * 1000))
+        return None
+
     def execute(self, driver):
         """
         Execute the compiled script on a separate thread
@@ -99,7 +223,19 @@ class LEDEngine:
             # We need a LED driver and a terminate signal.
             # Use configuration to determine which driver to use. Wire to DotStar initially.
 
-            cpu = script_cpu_led.ScriptCPULED(self._dev, self._vm, self._terminate_signal)
+            profiler = LEDEngine._create_profiler(self._vm)
+            telemetry = LEDEngine._create_telemetry()
+            config = Configuration.get_configuration()
+
+            # Optional low power do-at and pause waits. The terminate button wakes the board.
+            idle_wait = IdleWait(self._terminate_signal,
+                                 lightsleep=config.get(Configuration.CFG_LIGHTSLEEP, False),
+                                 wake_pin=config[Configuration.CFG_TERMINATE_BUTTON_PIN])
+
+            # Garbage is collected between statements, not during animations
+            cpu = script_cpu_led.ScriptCPULED(self._dev, self._vm, self._terminate_signal,
+                                              profiler=profiler, telemetry=telemetry,
+                                              gc_scheduler=GCScheduler(), idle_wait=idle_wait)
             # TODO Consider running the script on a MicroPython _thread.
             # This will be required to support a "break in" button.
             cpu.run()
@@ -115,3 +251,74 @@ class LEDEngine:
             sys.print_exception(e)
             return False
         return True
+
+    def execute_zones(self, driver):
+        """
+        Execute the compiled zone scripts, each on a segment of the driver.
+        The zones share a frame clock and the driver is shown once per frame.
+        :param driver: An open LED driver for the whole string
+        :return: True if the zones ran. Otherwise, False.
+        """
+        return self.execute_outputs([driver])
+
+    def execute_outputs(self, drivers):
+        """
+        Execute the compiled zone scripts, each on a segment of its output's
+        driver. All zones share a frame clock and each driver is shown
+        at most once per frame.
+        :param drivers: An open LED driver for each output
+        :return: True if the zones ran. Otherwise, False.
+        """
+        self._dev = drivers[0]
+        try:
+            scheduler = ZoneScheduler(self._terminate_signal, telemetry=LEDEngine._create_telemetry())
+            # The zones share one garbage collection scheduler
+            gc_scheduler = GCScheduler()
+            for output_index, start, stop, vm in self._zones:
+                segment = SegmentDriver(drivers[output_index], start, stop)
+                cpu = script_cpu_led.ScriptCPULED(segment, vm, self._terminate_signal,
+                                                  profiler=LEDEngine._create_profiler(vm),
+                                                  gc_scheduler=gc_scheduler, zoned=True)
+                scheduler.add_zone(cpu, segment)
+            scheduler.run()
+        except KeyboardInterrupt:
+            self._terminate_signal.set_terminate_flag()
+            for driver in drivers:
+                driver.clear()
+            logger.info("ctrl-c terminated zone execution")
+            return False
+        except Exception as e:
+            logger.error("Unhandled exception running LED zones")
+            logger.error(e)
+            sys.print_exception(e)
+            return False
+        return True
+
+    def execute_calendar(self, driver, calendar, switch_time):
+        """
+        Execute the compiled script and change to the script the calendar
+        selects at midnight or when a script ends. The driver stays open.
+        Imports come from the compiler's import cache.
+        :param driver: An open LED driver
+        :param calendar: The ScriptCalendar that selected the compiled script
+        :param switch_time: When the compiled script is to be replaced
+        (a time.time() value) or None
+        :return: The result of the last execute()
+        """
+        while True:
+            self._terminate_signal.set_switch_time(switch_time)
+            rc = self.execute(driver)
+            if not rc or self._terminate_signal.is_terminate_requested():
+                return rc
+            switch_due = self._terminate_signal.is_switch_due()
+
+            script_file, switch_time = calendar.schedule()
+            if script_file != self._vm.script_file:
+                gc.collect()
+                if self.compile(script_file):
+                    logger.info(f"Changed to script {script_file}")
+                    continue
+                logger.error(f"{script_file} compile failed, {self._vm.script_file} continues")
+            if not switch_due:
+                # The script ended and the calendar did not change it
+                return rc
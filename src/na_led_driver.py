@@ -15,7 +15,9 @@
 from micropython_dotstar import DotStar, RGB, RBG, GRB, GBR, BRG, BGR
 from .driver_base import DriverBase
 import mp_logging as logging
-from machine import Pin, PWM
+from machine import Pin, PWM, Timer
+from array import array
+import time
 
 #
 # LED interface driver for non-addressable LED strings (4 wire type)
@@ -30,6 +32,10 @@ class MPNALEDString(DriverBase):
     A device driver must implement each of the methods in the DriverBase class.
     The driver class name is arbitrary and generally is not exposed.
     """
+    # Native fade update period
+    FADE_PERIOD_MS = 10
+    # Longest (scaled) fade duration that keeps fade arithmetic in small integers
+    FADE_MAX_SCALED_MS = 0x3FFFF
 
     def __init__(self):
         super().__init__()
@@ -46,9 +52,29 @@ class MPNALEDString(DriverBase):
         self._pwm_green_led = None
         self._pwm_blue_led = None
 
-        # The one and only pixel
-        self._na_pixels = [(0, 0, 0)]
+        # The one and only pixel (r, g, b)
+        self._frame = bytearray(3)
         self._brightness = 0
+        # Color value (0-255) to PWM duty (0-65535) with gamma and brightness applied.
+        # The extra entry lets 16 bit colors interpolate between table entries.
+        self._duty = array("H", bytearray(514))
+        # High resolution pixel (r, g, b), 0-65535 per channel. When _hires is set
+        # this is the pixel that is shown.
+        self._frame16 = array("H", bytearray(6))
+        self._hires = False
+        # Native fade state (see fade_to)
+        self._fade_from = array("H", bytearray(6))
+        self._fade_to = array("H", bytearray(6))
+        self._fade_start = 0
+        self._fade_duration = 1
+        self._fade_shift = 0
+        self._fade_timer = None
+        # Bound once so the timer callback does not allocate a bound method
+        self._fade_step_cb = self._fade_step
+        # Duty last written to each PWM channel, -1 if never written
+        self._red_duty = -1
+        self._green_duty = -1
+        self._blue_duty = -1
 
     @property
     def name(self):
@@ -86,26 +112,56 @@ class MPNALEDString(DriverBase):
     def _begin(self):
         return True
 
-    def show(self):
+    def _show(self, force):
         """
         Set the red, green and blue lines based on the one and only pixel
+        :param force: True to set the lines even if the pixel has not changed
         :return:
         """
-        # Scale colors according to brightness
-        red = self._na_pixels[0][0] * self._brightness
-        green = self._na_pixels[0][1] * self._brightness
-        blue = self._na_pixels[0][2] * self._brightness
+        if self._hires:
+            # Unchanged channels are skipped by _write_duty
+            self._write_duty(self._duty16(self._frame16[0]),
+                             self._duty16(self._frame16[1]),
+                             self._duty16(self._frame16[2]))
+            return True
 
-        pwm_red_value = MPNALEDString._pwm_value_from_rgb(red)
-        pwm_green_value = MPNALEDString._pwm_value_from_rgb(green)
-        pwm_blue_value = MPNALEDString._pwm_value_from_rgb(blue)
-
-        self._pwm_red_led.duty_u16(pwm_red_value)
-        self._pwm_green_led.duty_u16(pwm_green_value)
-        self._pwm_blue_led.duty_u16(pwm_blue_value)
+        if not self._frame_changed(self._frame, force):
+            return True
 
+        # Gamma and brightness are folded into the duty table
+        duty = self._duty
+        self._write_duty(duty[self._frame[0]], duty[self._frame[1]], duty[self._frame[2]])
         return True
 
+    def _duty16(self, value):
+        """
+        Convert a 16 bit channel value to a PWM duty by interpolating
+        between adjacent duty table entries
+        :param value: 0-65535
+        :return: PWM duty cycle value 0-65535
+        """
+        duty = self._duty
+        # Table position in 8.8 fixed point. v * 257 lands exactly on entry v.
+        position = (value * 255 + 255) >> 8
+        hi = position >> 8
+        low_duty = duty[hi]
+        return low_duty + (((duty[hi + 1] - low_duty) * (position & 0xFF)) >> 8)
+
+    def _write_duty(self, pwm_red_value, pwm_green_value, pwm_blue_value):
+        """
+        Write PWM duty values. Only channels whose duty changed are written.
+        :return: None
+        """
+        if pwm_red_value != self._red_duty:
+            self._pwm_red_led.duty_u16(pwm_red_value)
+            self._red_duty = pwm_red_value
+        if pwm_green_value != self._green_duty:
+            self._pwm_green_led.duty_u16(pwm_green_value)
+            self._green_duty = pwm_green_value
+        if pwm_blue_value != self._blue_duty:
+            self._pwm_blue_led.duty_u16(pwm_blue_value)
+            self._blue_duty = pwm_blue_value
+
     @property
     def numPixels(self):
         """
@@ -114,6 +170,14 @@ class MPNALEDString(DriverBase):
         """
         return self._num_pixels
 
+    @property
+    def frameBuffer(self):
+        """
+        Returns the single pixel (r, g, b). 16 bit colors are not included.
+        :return:
+        """
+        return self._frame
+
     def setBrightness(self, brightness):
         """
         Set brightness for entire string
@@ -122,9 +186,33 @@ class MPNALEDString(DriverBase):
         """
         # Scale brightness to 0-1.0
         self._brightness = float(brightness) / 255.0
+        self._build_duty_table()
         logger.debug(f"Brightness: {self._brightness}")
         return True
 
+    def setGamma(self, gamma):
+        """
+        Turn gamma correction on or off
+        :param gamma: True or False
+        :return:
+        """
+        DriverBase.setGamma(self, gamma)
+        self._build_duty_table()
+        return True
+
+    def _build_duty_table(self):
+        """
+        Build the color value to PWM duty table for the current gamma
+        and brightness settings
+        :return: None
+        """
+        table = DriverBase._gamma8 if self._gamma else range(256)
+        for v in range(256):
+            self._duty[v] = MPNALEDString._pwm_value_from_rgb(table[v] * self._brightness)
+        self._duty[256] = self._duty[255]
+        # The output changes even if the frame does not
+        self._refresh = True
+
     def setPixelColor(self, index, color_value):
         """
         Set the single pixel's color
@@ -133,23 +221,111 @@ class MPNALEDString(DriverBase):
         :return:
         """
         # Need to convert 0xrrggbb to (r,g,b)
-        r = (color_value >> 16) & 0xFF
-        g = (color_value >> 8) & 0xFF
-        b = color_value & 0xFF
         # This is here in case deep debugging is required. It is really slow.
-        # logger.debug(f"index: {index} rgb: {r} {g} {b}")
+        # logger.debug(f"index: {index} color: {hex(color_value)}")
         # Set the single pixel's color
-        self._na_pixels[0] = (r, g, b)
+        self._frame[0] = (color_value >> 16) & 0xFF
+        self._frame[1] = (color_value >> 8) & 0xFF
+        self._frame[2] = color_value & 0xFF
+        self._dirty = True
+        if self._hires:
+            # Back to 8 bit colors. The lines must be set even if the frame is unchanged.
+            self._hires = False
+            self._refresh = True
+        return True
+
+    @property
+    def supports_fade(self):
         return True
 
+    def fade_to(self, rgb16, duration_ms):
+        """
+        Fade from the current color to a new color. The fade runs from
+        a timer and interpolates in 16 bit space, so the caller only needs
+        to wait for it to finish (see fading). Any fade in progress is cancelled.
+        The timer writes the PWM duty directly. Its steps are not frames:
+        show() is not called, so frame hooks (telemetry, profiler) and frame
+        recording do not see them. The caller shows the final color when
+        the fade ends.
+        :param rgb16: Target color (r, g, b), 0-65535 per channel
+        :param duration_ms: Length of the fade in milliseconds
+        :return: True (the fade was started)
+        """
+        self.cancel_fade()
+
+        # The fade starts from what is being shown now
+        for c in range(3):
+            if self._hires:
+                self._fade_from[c] = self._frame16[c]
+            else:
+                self._fade_from[c] = self._frame[c] * 257
+            self._frame16[c] = self._fade_from[c]
+            self._fade_to[c] = rgb16[c]
+        self._hires = True
+
+        # Elapsed time is scaled so the step arithmetic stays in small integers
+        self._fade_duration = max(int(duration_ms), 1)
+        self._fade_shift = 0
+        while (self._fade_duration >> self._fade_shift) > MPNALEDString.FADE_MAX_SCALED_MS:
+            self._fade_shift += 1
+
+        self._fade_start = time.ticks_ms()
+        self._fade_timer = Timer(period=MPNALEDString.FADE_PERIOD_MS, mode=Timer.PERIODIC,
+                                 callback=self._fade_step_cb)
+        return True
+
+    @property
+    def fading(self):
+        """
+        Returns True while a native fade is in progress
+        :return:
+        """
+        return self._fade_timer is not None
+
+    def cancel_fade(self):
+        """
+        Stop a fade in progress. The current color is left showing.
+        :return:
+        """
+        if self._fade_timer is not None:
+            self._fade_timer.deinit()
+            self._fade_timer = None
+        return True
+
+    def _fade_step(self, timer):
+        """
+        Timer callback that moves the fade one step
+        :param timer: The fade timer
+        :return: None
+        """
+        if self._fade_timer is None:
+            return
+        shift = self._fade_shift
+        duration = self._fade_duration >> shift
+        elapsed = time.ticks_diff(time.ticks_ms(), self._fade_start) >> shift
+        if elapsed >= duration:
+            elapsed = duration
+        # Fraction of the fade completed, 0-4096
+        fraction = (elapsed << 12) // duration
+
+        for c in range(3):
+            f = self._fade_from[c]
+            self._frame16[c] = f + (((self._fade_to[c] - f) * fraction) >> 12)
+        self._write_duty(self._duty16(self._frame16[0]),
+                         self._duty16(self._frame16[1]),
+                         self._duty16(self._frame16[2]))
+
+        if elapsed == duration:
+            self.cancel_fade()
+
     def clear(self):
         """
         Clear (turn off) all pixels in the string
         :return:
         """
         # Yes, there's only one effective pixel
-        for i in range(self._numpixels):
-            self.setPixelColor(i, 0)
+        self._frame[:] = b"\x00\x00\x00"
+        self._dirty = True
         self.show()
         return True
 
@@ -164,14 +340,18 @@ class MPNALEDString(DriverBase):
         # self.pwm_green_led.deinit()
         # self.pwm_blue_led.deinit()
 
+        self.cancel_fade()
         if self._pwm_red_led is not None:
             # Instead, just set the color to zero
             self.setPixelColor(0, 0x000000)
-            self.show()
+            self.show(force=True)
 
             self._pwm_red_led = None
             self._pwm_green_led = None
             self._pwm_blue_led = None
+            self._red_duty = -1
+            self._green_duty = -1
+            self._blue_duty = -1
 
         return True
 
@@ -190,16 +370,3 @@ class MPNALEDString(DriverBase):
             p = 0.0
         pwm_value = (p / 255.0) * 65535.0
         return int(pwm_value)
-
-    def color(self, r, g, b, gamma=False):
-        """
-        Returns an RGB color in the format 0xRRGGBB
-        :param r: Red value 0-255
-        :param g: Green value 0-255
-        :param b: Blue value 0-255
-        :param gamma:
-        :return: 24-bit color value 0xRRGGBB
-        """
-        if gamma:
-            return (DriverBase._gamma8[r] << 16) | (DriverBase._gamma8[g] << 8) | DriverBase._gamma8[b]
-        return (r << 16) | (g << 8) | b
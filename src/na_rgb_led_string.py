@@ -10,10 +10,14 @@
 #
 
 
+from array import array
 from machine import Pin, PWM
 
 
 class NaRGBLEDString():
+    # Color value (0-255) to PWM duty (0-65535), built once by the first instance
+    _duty = None
+
     def __init__(self, red_pin=15, green_pin=14, blue_pin=13, pwm_freq=1000):
         """
         Initialize string instance
@@ -32,6 +36,16 @@ class NaRGBLEDString():
         self.pwm_red_led = None
         self.pwm_green_led = None
         self.pwm_blue_led = None
+        # Duty last written to each PWM channel, -1 if never written
+        self._red_duty = -1
+        self._green_duty = -1
+        self._blue_duty = -1
+
+        if NaRGBLEDString._duty is None:
+            duty = array("H", bytearray(512))
+            for v in range(256):
+                duty[v] = NaRGBLEDString._pwm_value_from_rgb(v)
+            NaRGBLEDString._duty = duty
 
     def open(self):
         """
@@ -47,6 +61,10 @@ class NaRGBLEDString():
         self.pwm_blue_led = PWM(Pin(self.blue_gpio_pin, Pin.OUT))
         self.pwm_blue_led.freq(self.pwm_freq)
 
+        self._red_duty = -1
+        self._green_duty = -1
+        self._blue_duty = -1
+
     def close(self):
         """
         Shutdown the LED string
@@ -59,7 +77,10 @@ class NaRGBLEDString():
         # self.pwm_blue_led.deinit()
 
         if self.pwm_red_led is not None:
-            # Instead, just set the color to zero
+            # Instead, just set the color to zero, written even if it is unchanged
+            self._red_duty = -1
+            self._green_duty = -1
+            self._blue_duty = -1
             self.set_color(0, 0, 0)
 
             self.pwm_red_led = None
@@ -70,17 +91,36 @@ class NaRGBLEDString():
         """
         Set the string color with an RGB value. In reality, this sets
         the duty cycle of the PWM thus controlling the brightness of each LED.
+        Only channels whose duty changed are written.
         :param red: 0-255
         :param green: 0-255
         :param blue: 0-255
         :return: None
         """
-        pwm_red_value = NaRGBLEDString._pwm_value_from_rgb(red)
-        pwm_green_value = NaRGBLEDString._pwm_value_from_rgb(green)
-        pwm_blue_value = NaRGBLEDString._pwm_value_from_rgb(blue)
-        self.pwm_red_led.duty_u16(pwm_red_value)
-        self.pwm_green_led.duty_u16(pwm_green_value)
-        self.pwm_blue_led.duty_u16(pwm_blue_value)
+        pwm_red_value = NaRGBLEDString._duty_from_rgb(red)
+        pwm_green_value = NaRGBLEDString._duty_from_rgb(green)
+        pwm_blue_value = NaRGBLEDString._duty_from_rgb(blue)
+        if pwm_red_value != self._red_duty:
+            self.pwm_red_led.duty_u16(pwm_red_value)
+            self._red_duty = pwm_red_value
+        if pwm_green_value != self._green_duty:
+            self.pwm_green_led.duty_u16(pwm_green_value)
+            self._green_duty = pwm_green_value
+        if pwm_blue_value != self._blue_duty:
+            self.pwm_blue_led.duty_u16(pwm_blue_value)
+            self._blue_duty = pwm_blue_value
+
+    @staticmethod
+    def _duty_from_rgb(rgb):
+        """
+        Look up the PWM duty for an RGB value. Values that are not
+        integers 0-255 (e.g. 127.6) are converted as before.
+        :param rgb: a value in the range 0-255
+        :return: PWM duty cycle value 0-65535
+        """
+        if type(rgb) is int and 0 <= rgb <= 255:
+            return NaRGBLEDString._duty[rgb]
+        return NaRGBLEDString._pwm_value_from_rgb(rgb)
 
     @staticmethod
     def _pwm_value_from_rgb(rgb):
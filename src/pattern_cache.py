@@ -0,0 +1,60 @@
+#
+# pattern_cache.py - precomputed frames for periodic algorithms
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+
+class PatternCache:
+    """
+    A periodic algorithm that shows a small, fixed set of distinct frames
+    can render each frame once into a pattern cache and then flip between
+    them. Each frame is a RotatingFrame in the driver's layout, so showing
+    one costs a slice copy (see setPattern in the drivers), and a frame
+    can also be scrolled by setting its head.
+    """
+    def __init__(self, leddev):
+        """
+        Create an empty pattern cache for a driver
+        :param leddev: The LED driver the frames will be shown on
+        """
+        self._leddev = leddev
+        self._frames = []
+
+    def add(self, colors):
+        """
+        Render a frame and add it to the cache
+        :param colors: A sequence of 0xrrggbb values
+        :return: The new frame (a RotatingFrame)
+        """
+        frame = self._leddev.createPattern(colors)
+        self._frames.append(frame)
+        return frame
+
+    def __len__(self):
+        return len(self._frames)
+
+    def frame(self, index):
+        """
+        Returns a cached frame
+        :param index: 0 <= index < len(cache)
+        :return: A RotatingFrame
+        """
+        return self._frames[index]
+
+    def show(self, index, head=0):
+        """
+        Copy a cached frame into the driver's frame buffer. The caller
+        calls the driver's show().
+        :param index: 0 <= index < len(cache)
+        :param head: Pattern pixel shown by the first pixel of the string
+        :return: None
+        """
+        frame = self._frames[index]
+        frame.head = head
+        self._leddev.setPattern(frame)
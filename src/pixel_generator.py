@@ -20,10 +20,22 @@
 class PixelGenerator:
     """
     Template base class for a pixel generator.
+    Generators are run by the generator statement. Register a generator
+    class in generator_registry to make it available to scripts.
     """
     def __init__(self, num_pixels=0):
         self.num_pixels = num_pixels
 
+    @classmethod
+    def from_args(cls, num_pixels, args):
+        """
+        Create a generator from generator statement arguments
+        :param num_pixels: Number of pixels in string
+        :param args: List of resolved statement arguments (numbers, colors or evals)
+        :return: A generator instance
+        """
+        return cls(num_pixels=num_pixels)
+
     def start(self):
         pass
 
@@ -38,6 +50,21 @@ class PixelGenerator:
         """
         return 0, 0, 0
 
+    def render_into(self, buf):
+        """
+        Fill a whole frame buffer. Generators should override this
+        with a bulk implementation.
+        :param buf: A bytearray of num_pixels * 3 bytes (packed r, g, b)
+        :return: None
+        """
+        offset = 0
+        for n in range(self.num_pixels):
+            rgb = self.pixel(n)
+            buf[offset] = rgb[0]
+            buf[offset + 1] = rgb[1]
+            buf[offset + 2] = rgb[2]
+            offset += 3
+
     def stop(self):
         pass
 
@@ -0,0 +1,202 @@
+#
+# recording_driver.py - driver wrapper that logs every shown frame
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# Frame log format (little endian)
+#   4 bytes  magic "LEDR"
+#   u8       version
+#   Records
+#     u32    ticks_ms when show() was called
+#     u16    frame length in bytes
+#     frame  the driver's frame buffer (driver layout, see frameBuffer)
+#
+# Under CPython, put tools/host on sys.path for the utime stand-in.
+#
+
+import utime
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+LOG_MAGIC = b"LEDR"
+LOG_VERSION = 1
+LOG_HEADER_SIZE = 5
+LOG_RECORD_HEADER_SIZE = 6
+# ticks_ms() wraps at 2**30 on the Pico (and the utime stand-in)
+TICKS_PERIOD = 1 << 30
+
+
+class RecordingDriver:
+    """
+    Wraps a driver (any DriverBase implementation) and appends each
+    show() to a frame log. Records are gathered in a preallocated buffer
+    that is written to the log in large blocks. Use it wherever the
+    wrapped driver would be used.
+    """
+    def __init__(self, driver, log_path, block_size=4096):
+        """
+        Wrap a driver
+        :param driver: An open LED driver
+        :param log_path: Frame log file to be written
+        :param block_size: Size of the write buffer
+        """
+        self._driver = driver
+        self._log = open(log_path, "wb")
+        self._block = bytearray(block_size)
+        self._block_mv = memoryview(self._block)
+        self._pos = 0
+        self.frames = 0
+        self._log.write(LOG_MAGIC + bytes([LOG_VERSION]))
+
+    @property
+    def driver(self):
+        """
+        Returns the wrapped driver
+        :return:
+        """
+        return self._driver
+
+    def __getattr__(self, name):
+        # Anything not wrapped here goes to the wrapped driver
+        return getattr(self._driver, name)
+
+    @property
+    def name(self):
+        return "Recording " + self._driver.name
+
+    @property
+    def numPixels(self):
+        return self._driver.numPixels
+
+    @property
+    def fading(self):
+        return self._driver.fading
+
+    def color(self, r, g, b, gamma=False):
+        return self._driver.color(r, g, b, gamma=gamma)
+
+    def setPixelColor(self, index, color_value):
+        return self._driver.setPixelColor(index, color_value)
+
+    def setPixels(self, rgb_buf, start=0):
+        return self._driver.setPixels(rgb_buf, start)
+
+    def setPattern(self, pattern, start=0, count=None):
+        return self._driver.setPattern(pattern, start, count)
+
+    def show(self, force=False):
+        """
+        Log the frame, then show it
+        :param force: Passed to the wrapped driver
+        :return:
+        """
+        self._record(utime.ticks_ms(), self._driver.frameBuffer)
+        return self._driver.show(force=force)
+
+    def show_start(self, force=False):
+        """
+        Log the frame, then start showing it
+        :param force: Passed to the wrapped driver
+        :return:
+        """
+        self._record(utime.ticks_ms(), self._driver.frameBuffer)
+        return self._driver.show_start(force=force)
+
+    def show_wait(self):
+        return self._driver.show_wait()
+
+    def clear(self):
+        # The wrapped driver's clear() shows the cleared frame
+        result = self._driver.clear()
+        self._record(utime.ticks_ms(), self._driver.frameBuffer)
+        return result
+
+    def _record(self, ticks, frame):
+        """
+        Append a record to the write buffer
+        :param ticks: ticks_ms() value
+        :param frame: The frame buffer or None
+        :return: None
+        """
+        length = len(frame) if frame is not None else 0
+        if self._pos + LOG_RECORD_HEADER_SIZE + length > len(self._block):
+            self.flush()
+        block = self._block
+        pos = self._pos
+        block[pos] = ticks & 0xFF
+        block[pos + 1] = (ticks >> 8) & 0xFF
+        block[pos + 2] = (ticks >> 16) & 0xFF
+        block[pos + 3] = (ticks >> 24) & 0xFF
+        block[pos + 4] = length & 0xFF
+        block[pos + 5] = (length >> 8) & 0xFF
+        pos += LOG_RECORD_HEADER_SIZE
+        if pos + length > len(block):
+            # Larger than the write buffer, write the frame directly
+            self._pos = pos
+            self.flush()
+            self._log.write(frame)
+        elif length:
+            block[pos:pos + length] = frame
+            self._pos = pos + length
+        else:
+            self._pos = pos
+        self.frames += 1
+
+    def flush(self):
+        """
+        Write the buffered records to the log
+        :return: None
+        """
+        if self._pos:
+            self._log.write(self._block_mv[:self._pos])
+            self._pos = 0
+
+    def close_log(self):
+        """
+        Flush and close the frame log. The wrapped driver stays open.
+        :return: None
+        """
+        if self._log is not None:
+            self.flush()
+            self._log.close()
+            self._log = None
+            logger.info(f"{self.frames} frames recorded")
+
+    def close(self):
+        """
+        Close the frame log and the wrapped driver
+        :return:
+        """
+        self.close_log()
+        return self._driver.close()
+
+
+def read_frame_log(path):
+    """
+    Read a frame log
+    :param path: Frame log file
+    :return: A generator of (ticks_ms, frame bytes) tuples
+    """
+    with open(path, "rb") as fh:
+        header = fh.read(LOG_HEADER_SIZE)
+        if len(header) != LOG_HEADER_SIZE or header[0:4] != LOG_MAGIC or header[4] != LOG_VERSION:
+            raise ValueError(f"{path} is not a version {LOG_VERSION} frame log")
+        while True:
+            record_header = fh.read(LOG_RECORD_HEADER_SIZE)
+            if len(record_header) < LOG_RECORD_HEADER_SIZE:
+                break
+            ticks = record_header[0] | (record_header[1] << 8) | \
+                (record_header[2] << 16) | (record_header[3] << 24)
+            length = record_header[4] | (record_header[5] << 8)
+            frame = fh.read(length)
+            if len(frame) < length:
+                break
+            yield ticks, frame
+
@@ -0,0 +1,95 @@
+#
+# rotating_frame.py - a pattern buffer that is shown through a moving window
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+
+class RotatingFrame:
+    """
+    A pattern of pixels plus a head offset. Pixel i of the string shows
+    pattern pixel (head + i) % length, so scrolling a pattern is just a
+    change of the head. The window is copied into a driver's frame
+    buffer with (at most) two slice copies.
+
+    The pattern bytes are in the layout of the driver that created the
+    pattern (see createPattern in the drivers). The pattern should be at
+    least as long as the string. Shorter patterns are repeated, which
+    costs one slice copy per repeat.
+    """
+    def __init__(self, pattern, pixel_size):
+        """
+        Create a rotating frame over a pattern buffer
+        :param pattern: A bytearray with the pattern in driver layout
+        :param pixel_size: Number of bytes per pixel in the pattern
+        """
+        self._pattern = memoryview(pattern)
+        self._pixel_size = pixel_size
+        self._length = len(pattern) // pixel_size
+        self._head = 0
+
+    @property
+    def length(self):
+        """
+        Returns the number of pixels in the pattern
+        :return:
+        """
+        return self._length
+
+    @property
+    def pixel_size(self):
+        return self._pixel_size
+
+    @property
+    def pattern(self):
+        """
+        Returns the pattern buffer (a memoryview)
+        :return:
+        """
+        return self._pattern
+
+    @property
+    def head(self):
+        """
+        Returns the pattern pixel shown by the first pixel of the string
+        :return:
+        """
+        return self._head
+
+    @head.setter
+    def head(self, head):
+        self._head = head % self._length
+
+    def advance(self, n=1):
+        """
+        Move the window along the pattern
+        :param n: Number of pixels to move (may be negative)
+        :return: The new head
+        """
+        self._head = (self._head + n) % self._length
+        return self._head
+
+    def copy_into(self, dst, dst_offset, pixels):
+        """
+        Copy the window starting at head into a frame buffer
+        :param dst: The destination buffer (a bytearray)
+        :param dst_offset: Byte offset of the first pixel in dst
+        :param pixels: Number of pixels to copy
+        :return: None
+        """
+        size = self._pixel_size
+        pattern = self._pattern
+        total = len(pattern)
+        start = self._head * size
+        remaining = pixels * size
+        while remaining > 0:
+            count = min(total - start, remaining)
+            dst[dst_offset:dst_offset + count] = pattern[start:start + count]
+            dst_offset += count
+            remaining -= count
+            start = 0
@@ -0,0 +1,181 @@
+#
+# script_calendar.py - index of the configured script calendar
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+import time
+import datetime
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _parse_date(date_str):
+    """
+    Parse a calendar date of format YYYY-MM-DD or MM-DD
+    :param date_str: YYYY-MM-DD or MM-DD
+    :return: A (year, month, day) tuple where year is 0 for MM-DD or None
+    """
+    try:
+        parts = [int(p) for p in date_str.split("-")]
+    except ValueError:
+        return None
+    if len(parts) == 3:
+        return parts[0], parts[1], parts[2]
+    if len(parts) == 2:
+        return 0, parts[0], parts[1]
+    return None
+
+
+class ScriptCalendar:
+    """
+    The script_calendar configuration as an index of day ordinals. Entry
+    dates are parsed once. For each year the entries are resolved into
+    sorted, non-overlapping ranges of day ordinals that cover the whole
+    year. A day that is in no entry uses the default script. Where
+    entries overlap, the first entry in the configuration wins, as
+    before. Finding the script for a day is a binary search.
+    """
+    def __init__(self, entries, default_script):
+        """
+        Create a calendar index
+        :param entries: A list of {"start": date, "end": date, "script_file": file}.
+        Dates are YYYY-MM-DD or MM-DD (every year).
+        :param default_script: The script for days that are not in any entry
+        """
+        self._default_script = default_script
+        self._entries = []
+        for entry in entries:
+            start = _parse_date(entry["start"])
+            end = _parse_date(entry["end"])
+            if start is None or end is None:
+                logger.error(f"Invalid calendar entry {entry['start']} {entry['end']}")
+                continue
+            self._entries.append((start, end, entry["script_file"]))
+        # The index for one year
+        self._year = 0
+        self._starts = []
+        self._ends = []
+        self._scripts = []
+
+    def _build(self, year):
+        """
+        Resolve the entries for a year and build the index
+        :param year: The year to be indexed
+        :return: None
+        """
+        first = datetime.date(year, 1, 1).toordinal()
+        last = datetime.date(year, 12, 31).toordinal()
+
+        # The entry ranges as day ordinals, in configuration order
+        ranges = []
+        for start, end, script_file in self._entries:
+            try:
+                start_ordinal = datetime.date(start[0] or year, start[1], start[2]).toordinal()
+                end_ordinal = datetime.date(end[0] or year, end[1], end[2]).toordinal()
+            except ValueError:
+                logger.error(f"Invalid calendar date {start} {end}")
+                continue
+            if start_ordinal > end_ordinal:
+                logger.warning(f"Calendar entry for {script_file} ends before it starts")
+                continue
+            if end_ordinal < first or start_ordinal > last:
+                continue
+            ranges.append((max(start_ordinal, first), min(end_ordinal, last), script_file))
+
+        # Every range edge starts a new span of days
+        edges = {first}
+        for start_ordinal, end_ordinal, script_file in ranges:
+            edges.add(start_ordinal)
+            if end_ordinal < last:
+                edges.add(end_ordinal + 1)
+        edges = sorted(edges)
+
+        starts = []
+        ends = []
+        scripts = []
+        for i in range(len(edges)):
+            day = edges[i]
+            script_file = self._default_script
+            for start_ordinal, end_ordinal, entry_script in ranges:
+                if start_ordinal <= day <= end_ordinal:
+                    script_file = entry_script
+                    break
+            # Adjacent spans with the same script are merged
+            if scripts and scripts[-1] == script_file:
+                ends[-1] = edges[i + 1] - 1 if i + 1 < len(edges) else last
+                continue
+            starts.append(day)
+            ends.append(edges[i + 1] - 1 if i + 1 < len(edges) else last)
+            scripts.append(script_file)
+
+        self._year = year
+        self._starts = starts
+        self._ends = ends
+        self._scripts = scripts
+
+    def _find(self, ordinal):
+        """
+        Binary search the index for a day
+        :param ordinal: A day ordinal in the indexed year
+        :return: The index of the span that holds the day
+        """
+        lo = 0
+        hi = len(self._starts) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._starts[mid] <= ordinal:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def lookup(self, ordinal, carry=True):
+        """
+        Find the script for a day
+        :param ordinal: The day as a date ordinal
+        :param carry: True to look into the next year for the next change
+        :return: A (script_file, next_change) tuple where next_change is
+        the ordinal of the first day that uses a different script.
+        """
+        year = datetime.date.fromordinal(ordinal).year
+        if year != self._year:
+            self._build(year)
+        i = self._find(ordinal)
+        script_file = self._scripts[i]
+        next_change = self._ends[i] + 1
+        if carry and i == len(self._starts) - 1:
+            # The last span of the year may carry on into the next year
+            next_script, next_year_change = self.lookup(next_change, carry=False)
+            if next_script == script_file:
+                next_change = next_year_change
+        return script_file, next_change
+
+    def schedule(self):
+        """
+        Find the script for the current date and when it should be replaced
+        :return: A (script_file, switch_time) tuple. switch_time is the
+        time.time() value of the midnight at which the calendar selects a
+        different script, or None if the date/time is not set.
+        """
+        lt = time.localtime()
+        # If the RTC fails, the year is usually 2000
+        if lt[0] <= 2000:
+            logger.warning(f"Date/time is not set, using default script {self._default_script}")
+            return self._default_script, None
+
+        today = datetime.date(lt[0], lt[1], lt[2]).toordinal()
+        script_file, next_change = self.lookup(today)
+        seconds_left = (next_change - today) * SECONDS_PER_DAY - (lt[3] * 3600 + lt[4] * 60 + lt[5])
+        logger.info(f"Date {lt[0]}-{lt[1]:02d}-{lt[2]:02d} using script file {script_file}")
+        logger.debug(f"Next calendar change: {datetime.date.fromordinal(next_change)}")
+        return script_file, time.time() + seconds_left
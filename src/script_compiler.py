@@ -16,9 +16,12 @@
 
 import datetime
 import mp_logging as logging
+import os
 import re
 import webcolors
 from mp_datetime import str_parse_time
+from src.generator_registry import get_generator
+from src.frame_file import FrameFileReader
 
 logger = logging.getLogger("led")
 
@@ -27,14 +30,32 @@ class ScriptCompiler:
     Builds an executable VM
     """
     _scrollpixels_default = 5
+    # Splits an eval expression into the names it uses
+    _identifier_split = re.compile(r"[^A-Za-z0-9_]+")
+    # Compiled imports: path -> ((path, file key) of every file compiled
+    # for the import, recorded definitions, (name, value) of every name the
+    # import read from outside). Shared by all compilers, so a library is
+    # only compiled once per session.
+    _import_cache = {}
+
+    # Recorded definition kinds
+    _DEF_COLOR = 0
+    _DEF_DEFINE = 1
+    _DEF_EVAL = 2
 
     def __init__(self, vm):
         self._last_error = None
         self._vm = vm
         self._stmt = None
-        self._file_depth = 0
-        self._line_number = [0]
-        self._file_path = [""]
+        # Files being compiled (main file, then imports): [path, line number]
+        self._file_stack = []
+        # Definition recorders, one for each import being compiled
+        self._recorders = []
+        # The (path, file key) of each file compiled, one list for each import being compiled
+        self._import_files = []
+        # Names read from outside the import (name -> value when read), one dict
+        # for each import being compiled
+        self._import_reads = []
         # Index of last encountered do-for-n statement -1 to n
         self._do_for_n = -1
         # Index of last encountered do-for statement -1 to n
@@ -74,11 +95,14 @@ class ScriptCompiler:
             "scrollpixels": self.scrollpixels_stmt,
             "randompixels": self.randompixels_stmt,
             "brightness": self.brightness_stmt,
+            "gamma": self.gamma_stmt,
             "sinewave": self.sinewave_stmt,
             "solidcolor": self.solidcolor_stmt,
             "colorfade": self.colorfade_stmt,
             "twocolor": self.twocolor_stmt,
             "color77": self.color77_stmt,
+            "generator": self.generator_stmt,
+            "playframes": self.playframes_stmt,
             "select-one": self.select_one,
             "select-one-end": self.select_one_end,
         }
@@ -104,24 +128,32 @@ class ScriptCompiler:
         :param script_file:
         :return:
         """
-        self._last_error = None
-        self._vm.script_file = script_file
+        main_file = len(self._file_stack) == 0
+        if main_file:
+            self._last_error = None
+            self._vm.script_file = script_file
 
         # Open the script file for compiling
         try:
             sf = open(script_file, "r")
-            self._file_path[self._file_depth] = script_file
         except Exception as ex:
             self.script_error(f"Error opening script file {script_file}")
             logger.error(f"{type(ex)}")
             logger.error(str(ex))
             return False
 
+        if self._import_files:
+            key = ScriptCompiler._file_key(script_file)
+            for files in self._import_files:
+                files.append((script_file, key))
+
+        file_frame = [script_file, 0]
+        self._file_stack.append(file_frame)
         valid = True
         stmt = sf.readline()
         while stmt and valid:
             self._stmt = stmt
-            self._line_number[self._file_depth] += 1
+            file_frame[1] += 1
 
             # Remove line end comment
             comment_start = stmt.find("#")
@@ -132,10 +164,12 @@ class ScriptCompiler:
 
             # Catch unhandled exceptions
             try:
+                if self._import_reads and tokens:
+                    self._note_reads(stmt, tokens)
                 valid = self.compile_statement(stmt, tokens)
             except Exception as ex:
                 self.script_error(str(ex))
-                return False
+                valid = False
 
             stmt = sf.readline()
 
@@ -144,10 +178,13 @@ class ScriptCompiler:
             logger.debug(f"{self._do_for + 1} do-for statement(s) open at script end")
 
         sf.close()
+        self._file_stack.pop()
 
         # End of main file
-        if self._file_depth == 0:
+        if main_file:
             logger.debug(f"{len(self._vm.stmts)} statements compiled")
+            if valid:
+                self._vm.report_memory()
         return valid
 
     def compile_statement(self, stmt, tokens):
@@ -172,7 +209,7 @@ class ScriptCompiler:
                 compiled_tokens = self._valid_stmts[tokens[0]](tokens)
                 # If the statement is valid and executable, add it to the statement list
                 if compiled_tokens and len(compiled_tokens):
-                    self._vm.stmts.append(compiled_tokens)
+                    self._vm.add_stmt(compiled_tokens)
                 elif compiled_tokens is None:
                     valid = False
         else:
@@ -192,17 +229,165 @@ class ScriptCompiler:
 
     def add_color(self, name, color_values):
         """
-        Adds a color to the color dictionary.
+        Adds a color to the color table.
         """
-        # In Python 3, the iterator returned by map can only be used once
-        self._vm.colors[name] = []
-        self._vm.colors[name].extend(map(int, color_values))
+        self._vm.colors.add(name, color_values)
+        self._record(ScriptCompiler._DEF_COLOR, name, self._vm.colors[name])
 
     def add_define(self, name, value):
         """
         Adds an alias with a float value defines dictionary.
         """
         self._vm.defines[name] = float(value)
+        self._record(ScriptCompiler._DEF_DEFINE, name, self._vm.defines[name])
+
+    def add_eval(self, name, value):
+        """
+        Adds an evaluated value to the evals dictionary.
+        """
+        self._vm.evals[name] = value
+        self._record(ScriptCompiler._DEF_EVAL, name, value)
+
+    def _record(self, kind, name, value):
+        """
+        Record a definition made while imports are being compiled
+        :param kind: _DEF_COLOR, _DEF_DEFINE or _DEF_EVAL
+        :param name: Defined name
+        :param value: Defined value
+        :return: None
+        """
+        for recorder in self._recorders:
+            recorder.append((kind, name, value))
+
+    def _note_reads(self, stmt, tokens):
+        """
+        Note the names a statement may read while imports are being compiled.
+        Names the import has already defined are not reads from outside.
+        :param stmt: The statement without its comment
+        :param tokens: The statement tokens
+        :return: None
+        """
+        keyword = tokens[0]
+        if keyword == "import":
+            # Nested imports note their own reads
+            return
+        if keyword == "eval":
+            # Eval expressions are case sensitive
+            parts = stmt.split(None, 2)
+            names = ScriptCompiler._identifier_split.split(parts[2]) if len(parts) > 2 else []
+        elif keyword == "color" or keyword == "define":
+            names = tokens[2:]
+        else:
+            names = tokens[1:]
+
+        for i in range(len(self._import_reads)):
+            reads = self._import_reads[i]
+            definitions = self._recorders[i]
+            for name in names:
+                if name and name not in reads and not ScriptCompiler._defines(definitions, name):
+                    reads[name] = self._name_value(name)
+
+    @staticmethod
+    def _defines(definitions, name):
+        """
+        Determine if recorded definitions define a name
+        :param definitions: Recorded definitions
+        :param name: A name
+        :return: True if the name is defined
+        """
+        for definition in definitions:
+            if definition[1] == name:
+                return True
+        return False
+
+    def _name_value(self, name):
+        """
+        The current meaning of a name
+        :param name: A name
+        :return: A (define, eval, color) tuple. Each is None if the name is not one.
+        """
+        vm = self._vm
+        return (vm.defines.get(name),
+                vm.evals.get(name),
+                vm.colors[name] if name in vm.colors else None)
+
+    def _reads_unchanged(self, reads):
+        """
+        Determine if names read by an import still have the same values
+        :param reads: A sequence of (name, value)
+        :return: True if no name has changed
+        """
+        for name, value in reads:
+            if self._name_value(name) != value:
+                return False
+        return True
+
+    def _replay(self, definitions):
+        """
+        Make the definitions recorded when a library was compiled
+        :param definitions: Recorded definitions
+        :return: None
+        """
+        for kind, name, value in definitions:
+            if kind == ScriptCompiler._DEF_COLOR:
+                self.add_color(name, value)
+            elif kind == ScriptCompiler._DEF_DEFINE:
+                self.add_define(name, value)
+            else:
+                self.add_eval(name, value)
+
+    @staticmethod
+    def _file_key(path):
+        """
+        Identifies a version of a file
+        :param path: File path
+        :return: (size, modification time) or None if the file cannot be found
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st[6], st[8]
+
+    @staticmethod
+    def _files_unchanged(files):
+        """
+        Determine if files are still the versions that were compiled
+        :param files: A sequence of (path, file key)
+        :return: True if no file has changed
+        """
+        for path, key in files:
+            if key is None or ScriptCompiler._file_key(path) != key:
+                return False
+        return True
+
+    @staticmethod
+    def _normalize_path(path):
+        """
+        Normalize a file path so that a file has one name (a.led, ./a.led)
+        :param path: File path
+        :return: The path without empty, . and resolvable .. parts
+        """
+        parts = []
+        for part in path.split("/"):
+            if part == "" or part == ".":
+                continue
+            if part == ".." and parts and parts[-1] != "..":
+                parts.pop()
+            else:
+                parts.append(part)
+        normal = "/".join(parts)
+        if path.startswith("/"):
+            return "/" + normal
+        return normal
+
+    @classmethod
+    def clear_import_cache(cls):
+        """
+        Forget all compiled imports
+        :return: None
+        """
+        cls._import_cache.clear()
 
     def are_valid_colors(self, values):
         """
@@ -392,10 +577,10 @@ class ScriptCompiler:
         :return:
         """
         self._last_error = []
-        if self._stmt:
+        if self._stmt and self._file_stack:
             error_at = "Script error in file {0} at line {1}".format(
-                         self._file_path[self._file_depth],
-                         self._line_number[self._file_depth])
+                         self._file_stack[-1][0],
+                         self._file_stack[-1][1])
             logger.error(error_at)
             logger.error(self._stmt)
             self._last_error.append(error_at)
@@ -435,14 +620,27 @@ class ScriptCompiler:
             return None
 
         try:
-            v = eval(rm.group(3), self._vm.evals, self._vm.colors)
-            self._vm.evals[rm.group(2)] = v
+            v = eval(rm.group(3), self._vm.evals, self._eval_colors(rm.group(3)))
+            self.add_eval(rm.group(2), v)
         except Exception as ex:
             self.script_error(str(ex))
             return None
 
         return []
 
+    def _eval_colors(self, expression):
+        """
+        Build the local names for an eval expression. Only the colors
+        the expression names are included.
+        :param expression: Python expression
+        :return: A dict of color name to (r, g, b)
+        """
+        colors = {}
+        for name in ScriptCompiler._identifier_split.split(expression):
+            if name in self._vm.colors:
+                colors[name] = self._vm.colors[name]
+        return colors
+
     def define_stmt(self, tokens):
         """
         define name v where v can be any value, int or float
@@ -461,7 +659,12 @@ class ScriptCompiler:
 
     def import_stmt(self, tokens):
         """
-        Import a source file directly in-line
+        Import a source file directly in-line.
+        A library (a file that only defines colors, defines and evals) is
+        compiled once. After that, its definitions are made from the import
+        cache without reading the file, until the file or a file it imports
+        changes, or a name it reads from the importing script has a
+        different value.
         :param tokens: filepath
         :return:
         """
@@ -469,22 +672,49 @@ class ScriptCompiler:
             self.script_error("Missing file path")
             return None
 
-        # Push the imported file onto the file stack
-        self._file_depth += 1
-        self._file_path.append(tokens[1])
-        self._line_number.append(0)
+        # The file path keeps its case (tokens are lower case)
+        path = ScriptCompiler._normalize_path(self._stmt.split("#")[0].split()[1])
+        for file_frame in self._file_stack:
+            if ScriptCompiler._normalize_path(file_frame[0]) == path:
+                self.script_error("Import cycle: " + " -> ".join([f[0] for f in self._file_stack] + [path]))
+                return None
+
+        cached = ScriptCompiler._import_cache.get(path)
+        if cached is not None and ScriptCompiler._files_unchanged(cached[0]) and \
+                self._reads_unchanged(cached[2]):
+            logger.debug(f"Import {path} from cache")
+            # An import being compiled depends on the cached files and reads too
+            for files in self._import_files:
+                files.extend(cached[0])
+            for i in range(len(self._import_reads)):
+                reads = self._import_reads[i]
+                for name, value in cached[2]:
+                    if name not in reads and not ScriptCompiler._defines(self._recorders[i], name):
+                        reads[name] = value
+            self._replay(cached[1])
+            return []
 
         # This is a recursive call to compile the imported file
-        # TODO Do we need a recursion limit here?
-        self.compile(tokens[1])
+        recorder = []
+        files = []
+        reads = {}
+        self._recorders.append(recorder)
+        self._import_files.append(files)
+        self._import_reads.append(reads)
+        stmt_count = len(self._vm.stmts)
+        valid = self.compile(path)
+        self._import_reads.pop()
+        self._import_files.pop()
+        self._recorders.pop()
+        if not valid:
+            return None
 
-        # Pop the file stack
-        self._file_depth -= 1
-        self._line_number.pop()
-        self._file_path.pop()
+        # Files that add statements are compiled each time they are imported
+        if len(self._vm.stmts) == stmt_count:
+            ScriptCompiler._import_cache[path] = (tuple(files), tuple(recorder), tuple(reads.items()))
 
-        # The cpu will ignore this statement
-        return tokens
+        # Nothing is executed for an import, so no statement is added
+        return []
 
     def do_for_n_stmt(self, tokens):
         """
@@ -686,7 +916,7 @@ class ScriptCompiler:
             return None
 
         # Update select-one stmt to point to end
-        self._vm.stmts[self._select_one].append(len(self._vm.stmts))
+        self._vm.append_operand(self._select_one, len(self._vm.stmts))
         self._select_one = -1
 
         return tokens
@@ -734,7 +964,7 @@ class ScriptCompiler:
             rgb = tokens[2]
             if not (rgb.startswith("0x") or rgb.startswith("0X")):
                 rgb = "0x" + rgb
-            intrgb = int(rgb)
+            intrgb = int(rgb, 16)
             cv = [0, 0, 0]
             for i in range(2, -1, -1):
                 cv[i] = intrgb & 0xFF
@@ -990,6 +1220,24 @@ class ScriptCompiler:
             return None
         return tokens
 
+    def gamma_stmt(self, tokens):
+        """
+        gamma on|off
+        :param tokens:
+        :return:
+        """
+        if len(tokens) < 2:
+            self.script_error("Not enough tokens")
+            return None
+        if tokens[1] == "on":
+            tokens[1] = True
+        elif tokens[1] == "off":
+            tokens[1] = False
+        else:
+            self.script_error("Gamma must be on or off")
+            return None
+        return tokens
+
     def twocolor_stmt(self, tokens):
         """
         twocolor r g b r g b [wait=500.0] [iterations=100]
@@ -1068,3 +1316,80 @@ class ScriptCompiler:
         token_index += r[0]
 
         return trans_tokens
+
+    def generator_stmt(self, tokens):
+        """
+        generator name [wait=50.0] [iterations=100] [args...]
+        The name must be a registered pixel generator (see generator_registry).
+        Arguments after iterations are passed to the generator. Each one can be
+        an eval, a defined color or a number. Wait and iterations are only
+        taken from tokens that resolve to numbers, so "generator name c77"
+        passes the eval c77 with the default wait and iterations.
+        :param tokens:
+        :return:
+        """
+        if len(tokens) < 2:
+            self.script_error("Not enough tokens")
+            return None
+        if get_generator(tokens[1]) is None:
+            self.script_error("Unrecognized generator: " + tokens[1])
+            return None
+        trans_tokens = [tokens[0], tokens[1]]
+        token_index = 2
+
+        # Resolve wait and iterations, which are optional
+        for default in (50.0, 100):
+            v = None
+            if len(tokens) > token_index:
+                v = self.resolve_define(tokens[token_index])
+            if isinstance(v, (int, float)):
+                token_index += 1
+            else:
+                v = float(default)
+            trans_tokens.append(v)
+
+        # Generator specific arguments
+        args = []
+        while len(tokens) > token_index:
+            token = tokens[token_index]
+            if token in self._vm.evals:
+                args.append(self._vm.evals[token])
+            elif token in self._vm.colors:
+                args.append(self._vm.colors[token])
+            else:
+                v = self.resolve_define(token)
+                if v is None:
+                    self.script_error("Invalid/undefined generator argument: " + token)
+                    return None
+                args.append(v)
+            token_index += 1
+        trans_tokens.append(tuple(args))
+
+        return trans_tokens
+
+    def playframes_stmt(self, tokens):
+        """
+        playframes file [loops=1]
+        Plays a frame file (see tools/bake_frames.py).
+        :param tokens:
+        :return:
+        """
+        if len(tokens) < 2:
+            self.script_error("Missing file path")
+            return None
+        # The file path keeps its case (tokens are lower case)
+        path = self._stmt.split("#")[0].split()[1]
+        try:
+            reader = FrameFileReader(path)
+            reader.close()
+        except Exception as ex:
+            self.script_error(f"Invalid frame file {path}: {str(ex)}")
+            return None
+
+        trans_tokens = [tokens[0], path]
+        r = self.resolve_iterations_arg(tokens, 2, default=1)
+        if r[1] is None or int(r[1]) < 1:
+            self.script_error("Invalid loops value")
+            return None
+        trans_tokens.append(int(r[1]))
+        return trans_tokens
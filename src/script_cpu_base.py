@@ -17,21 +17,42 @@ import time
 import datetime
 import mp_logging as logging
 import random
+from .idle_wait import IdleWait
 
 logger = logging.getLogger("led")
 
 class ScriptCPUBase:
-    def __init__(self, leddev, vm, terminate_event):
+    # Loop feet are garbage collection points (see GCScheduler)
+    LOOP_FOOT_STMTS = ("do-for-n-end", "do-for-end", "do-at-end", "do-until-end", "do-forever-end")
+
+    def __init__(self, leddev, vm, terminate_event, profiler=None, telemetry=None, gc_scheduler=None,
+                 idle_wait=None, zoned=False):
         """
         Constructor
         :param leddev: A LED device driver instance (e.g. ws2811 or dotstar)
         :param vm: A script VM instance
         :param terminate_event: A threading event to be tested for termination
+        :param profiler: Optional ScriptProfiler instance
+        :param telemetry: Optional FrameTelemetry instance
+        :param gc_scheduler: Optional GCScheduler instance
+        :param idle_wait: Optional IdleWait instance for do-at and pause waits
+        :param zoned: True when the CPU runs as a zone of a ZoneScheduler.
+        Do-at and pause waits are then yielded instead of slept.
         :return: None
         """
         self._leddev = leddev
         self._vm = vm
         self._terminate_event = terminate_event
+        self._profiler = profiler
+        self._telemetry = telemetry
+        self._gc_scheduler = gc_scheduler
+        if idle_wait is None and not zoned:
+            idle_wait = IdleWait(terminate_event)
+        self._idle_wait = idle_wait
+        self._run_result = False
+        # Statements that run animation frame loops. Garbage is collected
+        # before they run. Derived CPUs add their algorithm statements.
+        self._algorithm_stmts = {"select-one"}
         # This is the equivalent of the next instruction address
         self._stmt_index = 0
         # Do-For-N control
@@ -79,24 +100,61 @@ class ScriptCPUBase:
 
     def run(self):
         """
-        Run the statements in the VM
-        :return:
+        Run the statements in the VM. The waits between frames are done here.
+        :return: True if the script ended without an error
+        """
+        self.start()
+        for wait_ms in self.steps():
+            self._frame_wait(wait_ms)
+        self.stop()
+        return self._run_result
+
+    def start(self):
+        """
+        Get ready to run the statements in the VM
+        :return: None
         """
         logger.info("Virtual CPU running...")
+        if self._profiler is not None:
+            self._leddev.add_frame_hook(self._profiler.frame)
+        if self._telemetry is not None:
+            self._leddev.add_frame_hook(self._telemetry.frame)
+            self._telemetry.reset()
+        if self._gc_scheduler is not None:
+            self._gc_scheduler.start()
+
+    def steps(self):
+        """
+        Run the statements in the VM as a generator. Each value yielded is
+        a wait in milliseconds before the next frame. The caller does the
+        wait, so several CPUs can share a frame clock (see ZoneScheduler).
+        :return: None. run_result is set when the generator ends.
+        """
         # The statement index is like an instruction address
         next_index = self._stmt_index
+        profiler = self._profiler
+        telemetry = self._telemetry
+        gc_scheduler = self._gc_scheduler
 
         # Run CPU until termination is signaled by main thread
         while not self._terminate_event.is_set():
             stmt = self._vm.stmts[self._stmt_index]
+            # Frame intervals are not measured across statements
+            if telemetry is not None:
+                telemetry.new_sequence()
             # Ignore statements with no handler
             if self._valid_stmts[stmt[0]] is not None:
+                # Collect garbage now instead of in the middle of an animation
+                if gc_scheduler is not None and stmt[0] in self._algorithm_stmts:
+                    gc_scheduler.boundary()
                 # The statement execution sets the next statement index
-                next_index = self._execute_stmt(stmt)
+                next_index = yield from self._execute_stmt(stmt, self._stmt_index)
                 # If the statement threw an exception end the script
                 if next_index < 0:
                     logger.error("Virtual CPU stopped due to error")
                     break
+                if gc_scheduler is not None and stmt[0] in ScriptCPUBase.LOOP_FOOT_STMTS:
+                    gc_scheduler.boundary()
             else:
                 # Unrecognized statements are treated as no-ops.
                 # Since the compile phase fails bad statements, the
@@ -114,26 +172,94 @@ class ScriptCPUBase:
             # This sets the next statement
             self._stmt_index = next_index
 
+            # A short click of the terminate button asks for a profile report
+            if profiler is not None and self._terminate_event.report_requested():
+                profiler.report(self._vm)
+
         # End of script error checks iff end of script reached
         if not self._terminate_event.is_set():
             if self._do_for_active >= 0:
                 logger.error(f"{self._do_for_active + 1} unterminated do-for statements")
 
+        self._run_result = next_index > 0
+
+    def stop(self):
+        """
+        Clean up after the statements have run
+        :return: None
+        """
         logger.info("Virtual CPU stopped")
+        if self._profiler is not None:
+            self._leddev.remove_frame_hook(self._profiler.frame)
+            self._profiler.report(self._vm)
+        if self._telemetry is not None:
+            self._leddev.remove_frame_hook(self._telemetry.frame)
+            self._telemetry.log_status()
+        if self._gc_scheduler is not None:
+            self._gc_scheduler.stop()
         self._reset()
         self._terminate_event.set_terminated()
-        return next_index > 0
 
-    def _execute_stmt(self, stmt):
+    @property
+    def run_result(self):
+        """
+        Returns True if the last run ended without an error
+        :return:
         """
-        Execute a script statement
+        return self._run_result
+
+    def _execute_stmt(self, stmt, stmt_index):
+        """
+        Execute a script statement. Handlers that wait between frames
+        are generators that yield the wait. Other handlers return the next
+        statement index directly.
         @param stmt: A list of the statements tokens.
+        @param stmt_index: Index of the statement in the VM (for profiling)
         @return: Returns the next statement index.
         """
         logger.debug(stmt)
+        if self._profiler is not None:
+            return (yield from self._profiler.profile(self._valid_stmts[stmt[0]], stmt, stmt_index))
         next_index = self._valid_stmts[stmt[0]](stmt)
+        if not isinstance(next_index, int):
+            next_index = yield from next_index
         return next_index
 
+    def _frame_wait(self, wait_ms):
+        """
+        Wait between the frames of an animation
+        :param wait_ms: Wait time in milliseconds (can be a float)
+        :return: None
+        """
+        telemetry = self._telemetry
+        if telemetry is None:
+            # Sleep time is in seconds (can be a float)
+            time.sleep(wait_ms / 1000.0)
+            return
+        if telemetry.status_due():
+            # This starts a new window, so logging is not counted as frame time
+            telemetry.log_status()
+        telemetry.wait_started(wait_ms)
+        time.sleep(wait_ms / 1000.0)
+        telemetry.wait_ended()
+
+    def _idle(self, seconds):
+        """
+        A long wait (do-at, pause). A CPU that runs alone sleeps with its
+        IdleWait. A zone CPU yields in chunks so the other zones keep running.
+        :param seconds: Length of the wait
+        :return: True if the wait ended. False if it was terminated.
+        """
+        if self._idle_wait is not None:
+            return self._idle_wait.wait_for(seconds)
+        end_time = time.time() + seconds
+        while not self._terminate_event.is_set():
+            remaining_ms = int((end_time - time.time()) * 1000)
+            if remaining_ms <= 0:
+                return True
+            yield min(remaining_ms, IdleWait.SLEEP_CHUNK_MS)
+        return False
+
     def _reset(self):
         """
         Reset all LED channels to value zero.
@@ -177,7 +303,7 @@ class ScriptCPUBase:
                 sub_value = t
                 symbol = t[1:]
                 if symbol in self._vm.colors:
-                    sub_value = str(self._vm.colors[symbol])
+                    sub_value = str(list(self._vm.colors[symbol]))
                 elif symbol in self._vm.defines:
                     sub_value = str(self._vm.defines[symbol])
                 msg = msg.replace(t, sub_value)
@@ -297,16 +423,9 @@ class ScriptCPUBase:
         logger.info(f"Waiting until {str(run_start_time)}..." )
 
         # Wait for start time to arrive. Break out on termination signal.
-        while not self._terminate_event.is_set():
-            time.sleep(1.0)
-            now = ScriptCPUBase._datetime_now()
-            # The deltatime will be negative until we cross the Do-At time
-            dt = now - run_start_time
-            if (dt.days == 0) and (dt.seconds >= 0):
-                logger.debug(f"Do-At begins at {str(now)}")
-
-                # On to the next sequential statement
-                break
+        wait_time = run_start_time - now
+        if (yield from self._idle(wait_time.days * 24 * 60 * 60 + wait_time.seconds)):
+            logger.debug(f"Do-At begins at {str(ScriptCPUBase._datetime_now())}")
 
         # Execution continues at the next statement after the Do-At
         return self._stmt_index + 1
@@ -428,10 +547,11 @@ class ScriptCPUBase:
         logger.debug(f"select-one: {rindex}")
 
         # Execute the selected statement
-        selected_stmt = self._vm.stmts[self._stmt_index + 1 + rindex]
+        selected_index = self._stmt_index + 1 + rindex
+        selected_stmt = self._vm.stmts[selected_index]
         # The next statement return value is ignored as it is only produced
         # by statements that are not supported within a select-one block.
-        next_index = self._execute_stmt(selected_stmt)
+        next_index = yield from self._execute_stmt(selected_stmt, selected_index)
 
         # The next statement is the select-one-end statement
         return stmt[1]
@@ -449,19 +569,11 @@ class ScriptCPUBase:
         Pause the script for a given amount of time
         """
         # Determine the time when the pause will end
-        now = ScriptCPUBase._datetime_now()
-        pause_time = datetime.timedelta(
-            seconds=(stmt[1].hour * 60 * 60) + (stmt[1].minute * 60) + stmt[1].second)
-        logger.debug(f"Pausing for {str(pause_time)}")
-
-        end_time = ScriptCPUBase._datetime_now() + pause_time
-        logger.debug(f"Pause ends at {str(end_time)}")
+        pause_seconds = (stmt[1].hour * 60 * 60) + (stmt[1].minute * 60) + stmt[1].second
+        logger.debug(f"Pausing for {pause_seconds} seconds")
 
         # Wait for end of pause time to arrive. Break out on termination signal.
-        now = ScriptCPUBase._datetime_now()
-        while (not self._terminate_event.is_set()) and (now <= end_time):
-            time.sleep(1.0)
-            now = ScriptCPUBase._datetime_now()
+        yield from self._idle(pause_seconds)
 
         return self._stmt_index + 1
 
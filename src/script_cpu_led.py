@@ -23,23 +23,38 @@
 from . import script_cpu_base
 from colorcyclers.sine_color_cycler import SineColorCycler
 from src.color77_generator import Color77PixelGenerator
+from src.generator_registry import get_generator
+from src.pattern_cache import PatternCache
+from src.frame_file import FrameFileReader
 import time
 import random
-from collections import deque
+from array import array
 import mp_logging as logging
 
 logger = logging.getLogger("led")
 
 class ScriptCPULED(script_cpu_base.ScriptCPUBase):
-    def __init__(self, leddev, vm, terminate_event):
+    # Number of 32 bit random words drawn at a time by randompixels (must be even)
+    RANDOM_BLOCK_SIZE = 64
+
+    def __init__(self, leddev, vm, terminate_event, profiler=None, telemetry=None, gc_scheduler=None,
+                 idle_wait=None, zoned=False):
         """
         Constructor
         :param leddev: A LED device driver instance (e.g. ws2811 or dotstar)
         :param vm: A script VM instance
         :param terminate_event: A threading event to be tested for termination
+        :param profiler: Optional ScriptProfiler instance
+        :param telemetry: Optional FrameTelemetry instance
+        :param gc_scheduler: Optional GCScheduler instance
+        :param idle_wait: Optional IdleWait instance for do-at and pause waits
+        :param zoned: True when the CPU runs as a zone of a ZoneScheduler
         :return: None
         """
-        script_cpu_base.ScriptCPUBase.__init__(self, leddev, vm, terminate_event)
+        script_cpu_base.ScriptCPUBase.__init__(self, leddev, vm, terminate_event,
+                                               profiler=profiler, telemetry=telemetry,
+                                               gc_scheduler=gc_scheduler, idle_wait=idle_wait,
+                                               zoned=zoned)
 
         # Valid algorithm statements and their handlers
         valid_stmts = {
@@ -53,15 +68,19 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
             "scrollpixels": self.scroll_pixels,
             "randompixels": self.random_pixels,
             "brightness": self.brightness,
+            "gamma": self.gamma,
             "sinewave": self.sinewave,
             "solidcolor": self.solidcolor_stmt,
             "colorfade": self.colorfade_stmt,
             "twocolor": self.twocolor_stmt,
             "color77": self.color77_stmt,
+            "generator": self.generator_stmt,
+            "playframes": self.playframes_stmt,
         }
 
         # Add the algorithms to the valid statement dict
         self._valid_stmts.update(valid_stmts)
+        self._algorithm_stmts.update(valid_stmts.keys())
 
     #
     # Start of algorithms derived from Adafruit code
@@ -88,7 +107,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
             for i in range(self._leddev.numPixels):
                 self._leddev.setPixelColor(i, self.wheel((i + j) & 255))
             self._leddev.show()
-            time.sleep(wait_ms / 1000.0)
+            yield wait_ms
         return self._stmt_index + 1
 
     def rainbowCycle(self, stmt):
@@ -101,7 +120,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
             for i in range(self._leddev.numPixels):
                 self._leddev.setPixelColor(i, self.wheel(int((i * 256 / self._leddev.numPixels) + j) & 255))
             self._leddev.show()
-            time.sleep(wait_ms / 1000.0)
+            yield wait_ms
         return self._stmt_index + 1
 
     def colorwipe_stmt(self, stmt):
@@ -120,7 +139,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
                 break
             self._leddev.setPixelColor(i, color)
             self._leddev.show()
-            time.sleep(wait_ms / 1000.0)
+            yield wait_ms
         return self._stmt_index + 1
 
     def theaterChase(self, stmt):
@@ -135,25 +154,27 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         if len(stmt) > 4:
             wait_ms = stmt[4]
             iterations = int(stmt[5])
+
+        # Every span-th pixel is on. The pattern is a whole number of spans
+        # long, so rotating it moves the lit pixels along the string.
+        length = ((self._leddev.numPixels + span - 1) // span) * span
+        colors = [0] * length
+        for i in range(0, length, span):
+            colors[i] = color
+        pattern = self._leddev.createPattern(colors)
+
         for j in range(iterations):
             if self._terminate_event.is_set():
                 break
             for q in range(span):
-                i = q
-                while i < self._leddev.numPixels:
-                    self._leddev.setPixelColor(i, color)
-                    i += span
-
+                # Pixels q, q + span,... are on
+                pattern.head = -q
+                self._leddev.setPattern(pattern)
                 self._leddev.show()
-                time.sleep(wait_ms/1000.0)
-
-                i = q
-                while i < self._leddev.numPixels:
-                    self._leddev.setPixelColor(i, 0)
-                    i += span
+                yield wait_ms
 
         # Clear the last set of pixels
-        self._leddev.show()
+        self._leddev.clear()
 
         return self._stmt_index + 1
 
@@ -172,7 +193,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         background_color = self._leddev.color(0, 0, 0)
 
         # This is the per pass step time
-        wait_ms = transit_time / 1000.0
+        wait_ms = transit_time
 
         for j in range(iterations):
             if self._terminate_event.is_set():
@@ -189,7 +210,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
                 self._leddev.setPixelColor(px, color)
                 self._leddev.show()
 
-            time.sleep(wait_ms)
+            yield wait_ms
 
         # Clear the last set of pixels
         self._leddev.clear()
@@ -212,6 +233,17 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         if len(stmt) > 7:
             wait_ms = stmt[7]
             iterations = int(stmt[8])
+
+        # One rotating pattern per color with every span-th pixel on.
+        # Rotating a pattern moves the lit pixels along the string.
+        length = ((self._leddev.numPixels + span - 1) // span) * span
+        patterns = PatternCache(self._leddev)
+        for color in colors:
+            pattern = [0] * length
+            for i in range(0, length, span):
+                pattern[i] = color
+            patterns.add(pattern)
+
         for j in range(iterations):
             # Alternate the first color
             c1 = (c1 + 1) % 2
@@ -219,23 +251,16 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
             if self._terminate_event.is_set():
                 break
             for q in range(span):
-                i = q
-                while i < self._leddev.numPixels:
-                    self._leddev.setPixelColor(i, colors[c])
-                    i += span
+                # Pixels q, q + span,... are on
+                patterns.show(c, head=-q)
                 # Cycle the color
                 c = (c + 1) % 2
 
                 self._leddev.show()
-                time.sleep(wait_ms/1000.0)
-
-                i = q
-                while i < self._leddev.numPixels:
-                    self._leddev.setPixelColor(i, 0)
-                    i += span
+                yield wait_ms
 
         # Clear the last set of pixels
-        self._leddev.show()
+        self._leddev.clear()
 
         return self._stmt_index + 1
 
@@ -257,7 +282,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
                     i += span
 
                 self._leddev.show()
-                time.sleep(wait_ms / 1000.0)
+                yield wait_ms
 
                 i = q
                 while i < self._leddev.numPixels:
@@ -281,7 +306,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         :return:
         """
         color = self._leddev.color(stmt[1], stmt[2], stmt[3])
-        wait_ms = float(stmt[4]) / 1000.0
+        wait_ms = float(stmt[4])
         iterations = int(float(stmt[5]))
         n = int(stmt[6])
 
@@ -296,7 +321,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
             if tail >= 0:
                 self._leddev.setPixelColor(tail, 0)  # Turn off 'tail'
             self._leddev.show()  # Refresh strip
-            time.sleep(wait_ms)  # Pause for delay time
+            yield wait_ms  # Pause for delay time
 
             head += 1  # Advance head position
             if (head >= self._leddev.numPixels):  # Off end of strip?
@@ -312,16 +337,6 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         self._leddev.show()
         return self._stmt_index + 1
 
-    @classmethod
-    def get_random_int(cls, max_value=100):
-        return int(random.random() * max_value)
-
-    def get_random_color(self):
-        r = int(ScriptCPULED.get_random_int(max_value=255))
-        g = int(ScriptCPULED.get_random_int(max_value=255))
-        b = int(ScriptCPULED.get_random_int(max_value=255))
-        return self._leddev.color(r, g, b)
-
     def random_pixels(self, stmt):
         """
         Show random pixels
@@ -329,23 +344,44 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         :param stmt:
         :return:
         """
-        active_size = int(self._leddev.numPixels / 2)
-        pixels = deque((), active_size)
-        color = self._leddev.color(255, 0, 0)
-        wait = float(stmt[1]) / 1000.0
+        num_pixels = self._leddev.numPixels
+        active_size = max(int(num_pixels / 2), 1)
+        # Ring of active pixel indexes. The oldest is turned off when the ring is full.
+        active = array("H", bytearray(2 * active_size))
+        active_head = 0
+        active_count = 0
+        wait_ms = float(stmt[1])
         iterations = int(stmt[2])
 
+        # Random bits are drawn a block at a time. Each frame uses two words:
+        # one for the pixel index and one for the color.
+        block = array("I", bytearray(4 * ScriptCPULED.RANDOM_BLOCK_SIZE))
+        block_index = len(block)
+        getrandbits = random.getrandbits
+
         for i in range(iterations):
             if self._terminate_event.is_set():
                 break
-            if len(pixels) >= active_size:
-                p = pixels.popleft()
-                self._leddev.setPixelColor(p, 0)
-            p = ScriptCPULED.get_random_int(max_value=self._leddev.numPixels)
-            pixels.append(p)
-            self._leddev.setPixelColor(p, self.get_random_color())
+            if block_index >= len(block):
+                for k in range(len(block)):
+                    block[k] = getrandbits(32)
+                block_index = 0
+
+            if active_count >= active_size:
+                self._leddev.setPixelColor(active[active_head], 0)
+            else:
+                active_count += 1
+            # Scale 16 random bits to 0 <= p < num_pixels
+            p = ((block[block_index] >> 16) * num_pixels) >> 16
+            active[active_head] = p
+            active_head += 1
+            if active_head >= active_size:
+                active_head = 0
+            self._leddev.setPixelColor(p, block[block_index + 1] & 0xFFFFFF)
+            block_index += 2
+
             self._leddev.show()
-            time.sleep(wait)
+            yield wait_ms
         self._leddev.clear()
         return self._stmt_index + 1
 
@@ -359,32 +395,41 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         self._leddev.setBrightness(stmt[1])
         return self._stmt_index + 1
 
+    def gamma(self, stmt):
+        """
+        Turn gamma correction on or off
+        gamma on|off
+        :param stmt:
+        :return:
+        """
+        self._leddev.setGamma(stmt[1])
+        return self._stmt_index + 1
+
     def sinewave(self, stmt):
         """
         sinewave [wait=200.0] [iterations=300] [width=127] [center=128]
         :param stmt:
         :return:
         """
-        wait_ms = float(stmt[1]) / 1000.0
+        wait_ms = float(stmt[1])
         iterations = int(float(stmt[2]))
         width = float(stmt[3])
         center = float(stmt[4])
         pixels = self._leddev.numPixels
 
-        color_gen = SineColorCycler()
         # In binary RGB format. May require reordering.
-        color_list = color_gen.create_color_list(center=center, width=width, colors=pixels)
+        # The list is cached, so repeated sinewave statements do not recalculate it.
+        color_list = SineColorCycler.get_color_list(center=center, width=width, colors=pixels)
 
-        colorx = 0
+        # Each frame shows the color list rotated by one more pixel
+        pattern = self._leddev.createPattern(color_list)
         for i in range(iterations):
             if self._terminate_event.is_set():
                 break
-            for cx in range(pixels):
-                modx = (colorx + cx) % len(color_list)
-                self._leddev.setPixelColor(cx, color_list[modx])
+            self._leddev.setPattern(pattern)
             self._leddev.show()
-            colorx = (colorx + 1) % len(color_list)
-            time.sleep(wait_ms)
+            pattern.advance()
+            yield wait_ms
         self._leddev.clear()
 
         return self._stmt_index + 1
@@ -406,9 +451,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
 
         self._leddev.show()
         if not self._terminate_event.is_set():
-            # Sleep time is in seconds (can be a float)
-            # Wait time is in milliseconds.
-            time.sleep(wait_ms / 1000.0)
+            yield wait_ms
         return self._stmt_index + 1
 
     def colorfade_stmt(self, stmt):
@@ -422,6 +465,10 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         wait_ms = stmt[7]
         iterations = stmt[8]
 
+        # Drivers that can fade on their own interpolate the whole fade
+        if (yield from self._colorfade_native(from_color, to_color, wait_ms, iterations)):
+            return self._stmt_index + 1
+
         # Calc color delta for each iteration
         delta_rgb = [0.0, 0.0, 0.0]
         for i in range(3):
@@ -437,9 +484,7 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
             self._leddev.show()
 
             if not self._terminate_event.is_set():
-                # Sleep time is in seconds (can be a float)
-                # Wait time is in milliseconds.
-                time.sleep(wait_ms / 1000.0)
+                yield wait_ms
             else:
                 break
 
@@ -449,6 +494,40 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
 
         return self._stmt_index + 1
 
+    def _colorfade_native(self, from_color, to_color, wait_ms, iterations):
+        """
+        Run a color fade using the driver's native fade.
+        :return: False if the driver does not support native fades
+        """
+        if not self._leddev.supports_fade:
+            return False
+
+        color = self._leddev.color(from_color[0], from_color[1], from_color[2])
+        for i in range(self._leddev.numPixels):
+            self._leddev.setPixelColor(i, color)
+        self._leddev.show()
+
+        rgb16 = (to_color[0] * 257, to_color[1] * 257, to_color[2] * 257)
+        if not self._leddev.fade_to(rgb16, int(wait_ms * iterations)):
+            return False
+
+        # Wait for the fade to finish, then hold the final color
+        while self._leddev.fading:
+            if self._terminate_event.is_set():
+                self._leddev.cancel_fade()
+                return True
+            yield 20
+
+        # The fade steps are not frames. The final color is shown as one,
+        # so frame hooks and frame recording see the end of the fade.
+        color = self._leddev.color(to_color[0], to_color[1], to_color[2])
+        for i in range(self._leddev.numPixels):
+            self._leddev.setPixelColor(i, color)
+        self._leddev.show()
+        if not self._terminate_event.is_set():
+            yield wait_ms
+        return True
+
     def twocolor_stmt(self, stmt):
         """
         Run the two color algorithm.
@@ -460,34 +539,27 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
         wait_ms = stmt[7]
         iterations = stmt[8]
 
-        which_color = True
+        # The two alternating frames are rendered once
+        c1 = self._leddev.color(color1[0], color1[1], color1[2])
+        c2 = self._leddev.color(color2[0], color2[1], color2[2])
+        frame1 = [c1, c2] * ((self._leddev.numPixels + 1) // 2)
+        frame2 = [c2, c1] * ((self._leddev.numPixels + 1) // 2)
+        frames = PatternCache(self._leddev)
+        frames.add(frame1[:self._leddev.numPixels])
+        frames.add(frame2[:self._leddev.numPixels])
+
         for it in range(int(iterations)):
-            for px in range(self._leddev.numPixels):
-                if px % 2 == 0:
-                    if which_color:
-                        current_color = self._leddev.color(color1[0], color1[1], color1[2])
-                    else:
-                        current_color = self._leddev.color(color2[0], color2[1], color2[2])
-                else:
-                    if which_color:
-                        current_color = self._leddev.color(color2[0], color2[1], color2[2])
-                    else:
-                        current_color = self._leddev.color(color1[0], color1[1], color1[2])
-
-                self._leddev.setPixelColor(px, current_color)
+            # Frames alternate, starting with frame1
+            frames.show(it % 2)
 
             # Show all pixels
             self._leddev.show()
 
             if not self._terminate_event.is_set():
-                # Sleep time is in seconds (can be a float)
-                # Wait time is in milliseconds.
-                time.sleep(wait_ms / 1000.0)
+                yield wait_ms
             else:
                 break
 
-            which_color = not which_color
-
         return self._stmt_index + 1
 
     def color77_stmt(self, stmt):
@@ -502,22 +574,100 @@ class ScriptCPULED(script_cpu_base.ScriptCPUBase):
 
         pixel_gen.start()
 
+        # The first frame sets every pixel. After that, only the pixels
+        # changed by step() are pushed to the driver.
+        for px in range(self._leddev.numPixels):
+            self._leddev.setPixelColor(px, pixel_gen.pixel_value(px))
+
         for it in range(int(iterations)):
-            for px in range(self._leddev.numPixels):
-                # Change color format from (r,g,b) to 0xrrggbb
-                c = Color77PixelGenerator.color(pixel_gen.pixel(px))
-                self._leddev.setPixelColor(px, c)
             self._leddev.show()
 
             if not self._terminate_event.is_set():
-                # Sleep time is in seconds (can be a float)
-                # Wait time is in milliseconds.
-                time.sleep(wait_ms / 1000.0)
+                yield wait_ms
             else:
                 break
 
             pixel_gen.step()
+            changed = pixel_gen.changed
+            for k in range(pixel_gen.changed_count):
+                px = changed[k]
+                self._leddev.setPixelColor(px, pixel_gen.pixel_value(px))
 
         pixel_gen.stop()
 
         return self._stmt_index + 1
+
+    def generator_stmt(self, stmt):
+        """
+        generator name wait iterations args
+        Runs a registered pixel generator. Each frame is rendered into
+        a packed r, g, b buffer and handed to the driver in one call.
+        :param stmt:
+        :return:
+        """
+        generator_class = get_generator(stmt[1])
+        wait_ms = stmt[2]
+        iterations = stmt[3]
+        pixels = self._leddev.numPixels
+
+        pixel_gen = generator_class.from_args(pixels, stmt[4])
+        frame = bytearray(pixels * 3)
+
+        pixel_gen.start()
+
+        for it in range(int(iterations)):
+            pixel_gen.render_into(frame)
+            self._leddev.setPixels(frame)
+            self._leddev.show()
+
+            if not self._terminate_event.is_set():
+                yield wait_ms
+            else:
+                break
+
+            pixel_gen.step()
+
+        pixel_gen.stop()
+
+        return self._stmt_index + 1
+
+    def playframes_stmt(self, stmt):
+        """
+        playframes file loops
+        Frames are read and decoded one record at a time into buffers
+        allocated when the file is opened, and paced by ticks_ms deadlines.
+        :param stmt:
+        :return:
+        """
+        try:
+            reader = FrameFileReader(stmt[1])
+        except Exception as ex:
+            logger.error(f"Unable to open frame file {stmt[1]}")
+            logger.error(str(ex))
+            return self._stmt_index + 1
+
+        if reader.pixels != self._leddev.numPixels:
+            logger.error(f"{stmt[1]} has {reader.pixels} pixels, the string has {self._leddev.numPixels}")
+            reader.close()
+            return self._stmt_index + 1
+
+        period = reader.period_ms
+        deadline = time.ticks_add(time.ticks_ms(), period)
+        try:
+            for loop in range(stmt[2]):
+                reader.rewind()
+                while not self._terminate_event.is_set() and reader.read_frame():
+                    self._leddev.setPixels(reader.frame)
+                    self._leddev.show()
+
+                    wait = time.ticks_diff(deadline, time.ticks_ms())
+                    if wait > 0:
+                        yield wait
+                    elif wait < -period:
+                        # More than a frame behind, start a new schedule
+                        deadline = time.ticks_ms()
+                    deadline = time.ticks_add(deadline, period)
+        finally:
+            # Also when the statement is closed (engine stop, calendar switch)
+            reader.close()
+        return self._stmt_index + 1
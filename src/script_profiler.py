@@ -0,0 +1,120 @@
+#
+# script_profiler.py - per statement execution profiler for the script CPU
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# Under CPython, put tools/host on sys.path for the utime stand-in.
+#
+
+import gc
+import utime
+from array import array
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+# gc.mem_free() is MicroPython only
+_mem_free = getattr(gc, "mem_free", None)
+
+
+class ScriptProfiler:
+    """
+    Accumulates counters for each statement of a compiled script. The
+    counters are arrays indexed by statement index that are allocated
+    once, when the profiler is created.
+      invocations   number of times the statement was executed
+      total_us      time spent executing the statement (inclusive)
+      frames        number of driver show() calls made by the statement
+      max_frame_us  longest time between frames within the statement
+      mem_used      sum of the gc.mem_free() drops across the statement
+    """
+    def __init__(self, stmt_count):
+        """
+        Create counters for a script
+        :param stmt_count: Number of statements in the VM
+        """
+        self.invocations = array("I", [0] * stmt_count)
+        self.total_us = array("q", [0] * stmt_count)
+        self.frames = array("I", [0] * stmt_count)
+        self.max_frame_us = array("I", [0] * stmt_count)
+        self.mem_used = array("q", [0] * stmt_count)
+        # The statement that owns frames as they are shown
+        self._current = -1
+        self._last_frame_us = 0
+
+    def profile(self, handler, stmt, stmt_index):
+        """
+        Execute a statement handler and accumulate its counters. This is
+        a generator that passes on the waits yielded by the handler.
+        :param handler: Statement handler
+        :param stmt: Statement tokens
+        :param stmt_index: Index of the statement in the VM
+        :return: The handler's next statement index
+        """
+        outer = self._current
+        self._current = stmt_index
+        mem_before = _mem_free() if _mem_free is not None else 0
+        start = utime.ticks_us()
+        self._last_frame_us = start
+
+        next_index = handler(stmt)
+        if not isinstance(next_index, int):
+            next_index = yield from next_index
+
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        mem_after = _mem_free() if _mem_free is not None else 0
+        self.invocations[stmt_index] += 1
+        self.total_us[stmt_index] += elapsed
+        self.mem_used[stmt_index] += mem_before - mem_after
+        # Frames after a nested statement (select-one) belong to the outer statement
+        self._current = outer
+        self._last_frame_us = utime.ticks_us()
+        return next_index
+
+    def frame(self, show_us):
+        """
+        Frame hook. Called by the driver after each show().
+        :param show_us: Time spent in show()
+        :return: None
+        """
+        i = self._current
+        if i < 0:
+            return
+        now = utime.ticks_us()
+        self.frames[i] += 1
+        frame_us = utime.ticks_diff(now, self._last_frame_us)
+        if frame_us > self.max_frame_us[i]:
+            self.max_frame_us[i] = frame_us
+        self._last_frame_us = now
+
+    def reset(self):
+        """
+        Zero all counters
+        :return: None
+        """
+        for counters in (self.invocations, self.total_us, self.frames, self.max_frame_us, self.mem_used):
+            for i in range(len(counters)):
+                counters[i] = 0
+
+    def report(self, vm, limit=10):
+        """
+        Log the statements that used the most time
+        :param vm: The VM that holds the profiled statements
+        :param limit: Maximum number of statements to report
+        :return: None
+        """
+        used = [i for i in range(len(self.invocations)) if self.invocations[i]]
+        used.sort(key=lambda i: self.total_us[i], reverse=True)
+        logger.info(f"Profile: {len(used)} statements executed")
+        for i in used[:limit]:
+            frames = self.frames[i]
+            total_ms = self.total_us[i] // 1000
+            logger.info(f"[{i}] {vm.stmts[i][0]} n={self.invocations[i]} ms={total_ms} "
+                        f"frames={frames} max_frame_ms={self.max_frame_us[i] / 1000.0:.1f} "
+                        f"mem={self.mem_used[i]}")
@@ -13,18 +13,36 @@
 # Script virtual machine
 #
 
+import mp_logging as logging
+from src.color_table import ColorTable
+
+logger = logging.getLogger("led")
+
+# Largest int stored in a tuple slot without a heap object (MicroPython small int)
+_SMALL_INT_MAX = (1 << 30) - 1
+
+
+def _gc_blocks(n):
+    """
+    Bytes used by an n byte heap object (the MicroPython heap allocates 16 byte blocks)
+    """
+    return ((n + 15) // 16) * 16
+
+
 class ScriptVM():
+    __slots__ = ("script_file", "stmts", "colors", "defines", "evals", "main_index", "_names")
+
     def __init__(self, script_file):
         # TODO Some/most/all of these should be made properties
 
         # Underlying script file
         self.script_file = script_file
 
-        # Script statements are a list of token lists
+        # Script statements are a list of tuples: (name, operand,...)
         self.stmts = []
 
         # Color definitions
-        self.colors = {}
+        self.colors = ColorTable()
 
         # Defines
         self.defines = {}
@@ -32,7 +50,7 @@ class ScriptVM():
         # Evaluated values
         self.evals = {}
         # The default color list for the color77 alg
-        self.evals["color77-default"] = [
+        self.evals["color77-default"] = (
             (255,0,0),
             (0,255,0),
             (0,0,255),
@@ -40,7 +58,92 @@ class ScriptVM():
             (255,0,255),
             (0,255,255),
             (255,0,255)
-        ]
+        )
 
         # Main statement index
         self.main_index = -1
+
+        # One copy of each statement name
+        self._names = {}
+
+    def add_stmt(self, tokens):
+        """
+        Add a compiled statement. The statement is stored as a tuple. The
+        statement name is shared by all statements with the same name and
+        whole number operands are stored as ints (which do not take heap space).
+        :param tokens: Compiled statement tokens (name, operand,...)
+        :return: The statement index
+        """
+        name = self._names.get(tokens[0])
+        if name is None:
+            name = tokens[0]
+            self._names[name] = name
+        operands = [name]
+        for v in tokens[1:]:
+            if isinstance(v, float) and v == int(v) and -_SMALL_INT_MAX <= v <= _SMALL_INT_MAX:
+                v = int(v)
+            operands.append(v)
+        self.stmts.append(tuple(operands))
+        return len(self.stmts) - 1
+
+    def append_operand(self, index, value):
+        """
+        Add an operand to a statement that has already been added
+        :param index: Statement index
+        :param value: The operand
+        :return: None
+        """
+        self.stmts[index] = self.stmts[index] + (value,)
+
+    @staticmethod
+    def operand_bytes(v):
+        """
+        Estimate the heap bytes used by a statement operand on a 32 bit MicroPython port
+        :param v: The operand
+        :return: Bytes
+        """
+        if v is None or isinstance(v, bool):
+            return 0
+        if isinstance(v, int):
+            return 0 if -_SMALL_INT_MAX <= v <= _SMALL_INT_MAX else 16
+        if isinstance(v, float):
+            return 16
+        if isinstance(v, str):
+            return _gc_blocks(12 + len(v))
+        if isinstance(v, list):
+            # Lists come from evals and are shared with the evals dict
+            return 0
+        if isinstance(v, tuple):
+            size = _gc_blocks(8 + 4 * len(v))
+            for item in v:
+                size += ScriptVM.operand_bytes(item)
+            return size
+        # Time structs and other objects
+        return 32
+
+    def stmt_bytes(self, index):
+        """
+        Estimate the heap bytes used by a statement. The shared statement
+        name is not counted.
+        :param index: Statement index
+        :return: Bytes
+        """
+        stmt = self.stmts[index]
+        size = _gc_blocks(8 + 4 * len(stmt))
+        for v in stmt[1:]:
+            size += ScriptVM.operand_bytes(v)
+        return size
+
+    def report_memory(self):
+        """
+        Log the estimated statement memory. Each statement is logged at the debug level.
+        :return: Total statement bytes
+        """
+        total = 0
+        for i in range(len(self.stmts)):
+            size = self.stmt_bytes(i)
+            total += size
+            logger.debug(f"[{i}] {self.stmts[i][0]} {size} bytes")
+        logger.info(f"{len(self.stmts)} statements use about {total} bytes, "
+                    f"{len(self.colors)} colors use {self.colors.bytes_used} bytes")
+        return total
@@ -0,0 +1,111 @@
+#
+# segment_driver.py - a range of a driver's pixels as a driver of its own
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+from .driver_base import DriverBase
+
+
+class SegmentDriver(DriverBase):
+    """
+    Pixels [start, stop) of a parent driver. Pixel 0 of the segment is
+    pixel start of the parent. Pixels are set in the parent's frame
+    buffer, but show() only asks for a frame. The ZoneScheduler shows
+    the parent once for all of the segments that asked.
+
+    Brightness and gamma belong to the physical string, so they are
+    passed on to the parent. Bulk writes (setPixels, patterns, clear)
+    are passed on with the segment's pixel offset, so they use the
+    parent's slice copies. A native fade (see fade_to) changes the whole
+    string, so a segment never fades natively and colorfade always uses
+    the script CPU's fade on a segment.
+    """
+    def __init__(self, parent, start, stop):
+        """
+        Create a segment view
+        :param parent: An open LED driver
+        :param start: First parent pixel of the segment
+        :param stop: One past the last parent pixel of the segment
+        """
+        super().__init__()
+        if start < 0 or stop > parent.numPixels or start >= stop:
+            raise ValueError(f"Segment [{start}, {stop}) is not within {parent.numPixels} pixels")
+        self._parent = parent
+        self._start = start
+        self._numpixels = stop - start
+        # Set by show(), cleared by the ZoneScheduler when the parent is shown
+        self.show_requested = False
+        self.force_requested = False
+
+    @property
+    def name(self):
+        return f"Segment {self._start}-{self._start + self._numpixels} of {self._parent.name}"
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def numPixels(self):
+        return self._numpixels
+
+    def _show(self, force):
+        """
+        Ask for the parent to be shown at the end of the frame
+        :param force: True to send the frame even if it has not changed
+        :return:
+        """
+        self.show_requested = True
+        if force:
+            self.force_requested = True
+        return True
+
+    def setBrightness(self, brightness):
+        return self._parent.setBrightness(brightness)
+
+    def setGamma(self, gamma):
+        return self._parent.setGamma(gamma)
+
+    @property
+    def gamma(self):
+        return self._parent.gamma
+
+    def setPixelColor(self, index, color_value):
+        return self._parent.setPixelColor(self._start + index, color_value)
+
+    def setPixels(self, rgb_buf, start=0):
+        return self._parent.setPixels(rgb_buf, self._start + start)
+
+    def createPattern(self, colors):
+        # The pattern is in the parent's frame buffer layout
+        return self._parent.createPattern(colors)
+
+    def setPattern(self, pattern, start=0, count=None):
+        if count is None:
+            count = self._numpixels
+        return self._parent.setPattern(pattern, self._start + start, count)
+
+    def clearPixels(self, start, count):
+        return self._parent.clearPixels(self._start + start, count)
+
+    def color(self, r, g, b, gamma=False):
+        return self._parent.color(r, g, b, gamma=gamma)
+
+    def clear(self):
+        """
+        Clear (turn off) the segment's pixels
+        :return:
+        """
+        self._parent.clearPixels(self._start, self._numpixels)
+        self.show()
+        return True
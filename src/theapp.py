@@ -22,15 +22,16 @@ import sys
 from machine import SPI, Pin
 from lcd_line_display import LCDLineDisplay
 from src.led_engine import LEDEngine
+from src.script_calendar import ScriptCalendar
 from src.dotstar_driver import MPDotStar
 from src.na_led_driver import MPNALEDString
 from src.ws281x_driver import WS281XDriver
+from src.recording_driver import RecordingDriver
 from src.runled import run_led
+from src.driver_benchmark import run_driver_benchmark
 from set_rtc import set_rtc
 from src.na_rgb_led_string_test import run_na_rgb_led_string
 import mp_logging as logging
-import datetime
-from mp_datetime import str_parse_date, date_now
 from console_logger import ConsoleLogger
 from lcd_logger import LCDLogger
 from rpico_board import is_host_connected
@@ -81,44 +82,177 @@ def compile_script(script_file):
     return engine
 
 
-def script_to_run():
+def script_calendar():
     """
-    Determine what script is to be run
-    :return: Script file to be run
+    Create the script calendar index from the configuration
+    :return: A ScriptCalendar
     """
-    script_file = None
     config = Configuration.get_configuration()
-
+    # The calendar is a list of date ranges with a script to be run
+    entries = []
+    if Configuration.CFG_SCRIPT_CALENDAR in config.keys():
+        logger.debug("Using configuration calendar for script file")
+        entries = config[Configuration.CFG_SCRIPT_CALENDAR]
     # The default script file
-    script_file = config[Configuration.CFG_SCRIPT_FILE]
+    return ScriptCalendar(entries, config[Configuration.CFG_SCRIPT_FILE])
 
-    # Get and check current date
-    now = date_now()
-    logger.debug(f"now: {now}")
-    # If the RTC fails, the year is usually 2000
-    if now.year <= 2000:
-        logger.warning(f"Date/time is not set, using default script {script_file}")
-        return script_file
 
-    # Look for a calendar schedule that applies to the current date
-    if Configuration.CFG_SCRIPT_CALENDAR in config.keys():
-        logger.debug("Using configuration calendar for script file")
-        # The calendar is a list of date ranges with a script to be run
-        calendar = config[Configuration.CFG_SCRIPT_CALENDAR]
-        found = False
-        for date_span in calendar:
-            start = str_parse_date(date_span["start"])
-            end = str_parse_date(date_span["end"])
-            logger.debug(f"start: {start} end: {end}")
-            if start <= now <= end:
-                script_file = date_span["script_file"]
-                logger.info(f"Date {now} using script file {script_file}")
-                found = True
-                break
-        if not found:
-            logger.error(f"No calendar entry was found for date {now}")
-
-    return script_file
+def compile_show():
+    """
+    Compile the configured zones or, when there are no zones, the script
+    the calendar selects
+    :return: An (engine, calendar, switch_time) tuple. The engine is None
+    if a compile failed. The calendar is None for zones.
+    """
+    config = Configuration.get_configuration()
+    if Configuration.CFG_ZONES in config.keys():
+        gc.collect()
+        engine = LEDEngine()
+        if not engine.compile_zones(config[Configuration.CFG_ZONES]):
+            logger.error("Zone compile failed")
+            return None, None, None
+        return engine, None, None
+
+    calendar = script_calendar()
+    script_file, switch_time = calendar.schedule()
+    logger.info(f"script_file: {script_file}")
+    return compile_script(script_file), calendar, switch_time
+
+
+def execute_show(engine, driver, calendar, switch_time):
+    """
+    Execute what compile_show() compiled on an open driver
+    :param engine: The engine returned by compile_show()
+    :param driver: An open LED driver
+    :param calendar: The calendar returned by compile_show()
+    :param switch_time: The switch time returned by compile_show()
+    :return: None
+    """
+    if calendar is None:
+        engine.execute_zones(driver)
+    else:
+        engine.execute_calendar(driver, calendar, switch_time)
+
+
+def set_gamma(driver, settings=None):
+    """
+    Apply the configured gamma correction mode to a driver
+    :param driver: An open LED driver
+    :param settings: Output settings that may override the configured gamma
+    :return: None
+    """
+    config = Configuration.get_configuration()
+    if settings is not None and Configuration.CFG_GAMMA in settings.keys():
+        config = settings
+    if Configuration.CFG_GAMMA in config.keys():
+        driver.setGamma(config[Configuration.CFG_GAMMA])
+        logger.info(f"Gamma: {config[Configuration.CFG_GAMMA]}")
+
+
+def open_dotstar(settings):
+    """
+    Open an APA102/DotStar driver
+    :param settings: A dict with the APA102/DotStar configuration keys
+    :return: The open driver
+    """
+    clk_pin = settings[Configuration.CFG_SPI_CLK]
+    tx_pin = settings[Configuration.CFG_SPI_TX]
+    rx_pin = settings[Configuration.CFG_SPI_RX]
+    spi_id = settings.get(Configuration.CFG_SPI_ID, 0)
+    spi = SPI(spi_id, sck=Pin(clk_pin), mosi=Pin(tx_pin), miso=Pin(rx_pin))
+    driver = MPDotStar()
+    driver.open(spi, settings[Configuration.CFG_PIXELS], order=settings[Configuration.CFG_ORDER])
+    set_gamma(driver, settings)
+    return driver
+
+
+def open_ws281x(settings, pio=False):
+    """
+    Open a WS281X/Neopixel driver
+    :param settings: A dict with the WS281X/Neopixel configuration keys
+    :param pio: True to send frames by PIO and DMA in the background
+    :return: The open driver
+    """
+    datapin = settings[Configuration.CFG_DATAPIN]
+    color_order = settings[Configuration.CFG_ORDER].upper()
+    logger.info(f"datapin: {datapin}")
+    logger.info((f"color_order: {color_order}"))
+    gc.collect()
+    if pio:
+        # rp2.DMA is only in recent firmware
+        from src.ws281x_pio_driver import WS281XPIODriver
+        driver = WS281XPIODriver(state_machine=settings.get(Configuration.CFG_STATE_MACHINE_ID, 0))
+    else:
+        driver = WS281XDriver()
+    driver.open(settings[Configuration.CFG_PIXELS], datapin=datapin, order=color_order)
+    set_gamma(driver, settings)
+    return driver
+
+
+def open_na(settings):
+    """
+    Open a non-addressable LED string driver
+    :param settings: A dict with the non-addressable LED configuration keys
+    :return: The open driver
+    """
+    red_pin = settings[Configuration.CFG_RED_PIN]
+    green_pin = settings[Configuration.CFG_GREEN_PIN]
+    blue_pin = settings[Configuration.CFG_BLUE_PIN]
+    pwm_freq = settings[Configuration.CFG_PWM_FREQ]
+    brightness = float(settings[Configuration.CFG_BRIGHTNESS]) / 100.0
+    logger.info(f"RGB pins: {red_pin}, {green_pin}, {blue_pin}")
+    logger.info(f"PWM freq: {pwm_freq}")
+    logger.info(f"Brightness: {brightness}")
+    driver = MPNALEDString()
+    driver.open(red_pin=red_pin, green_pin=green_pin, blue_pin=blue_pin, pwm_freq=pwm_freq)
+    driver.setBrightness(brightness)
+    set_gamma(driver, settings)
+    return driver
+
+
+def open_output(settings):
+    """
+    Open the driver of a configured output
+    :param settings: An entry of the outputs list
+    :return: The open driver or None if the driver type is not recognized
+    """
+    driver_type = settings[Configuration.CFG_OUTPUT_DRIVER].lower()
+    if driver_type == "apa102" or driver_type == "dotstar":
+        return open_dotstar(settings)
+    if driver_type == "ws281x" or driver_type == "neopixel":
+        return open_ws281x(settings)
+    if driver_type == "ws281x-pio":
+        return open_ws281x(settings, pio=True)
+    if driver_type == "non-addressable":
+        return open_na(settings)
+    logger.error(f"{driver_type} is not recognized as an output driver")
+    return None
+
+
+def record_frames(driver):
+    """
+    Wrap a driver in a RecordingDriver when a frame log is configured
+    :param driver: An open LED driver
+    :return: The driver to be given to the engine
+    """
+    config = Configuration.get_configuration()
+    if Configuration.CFG_RECORD_FILE in config.keys():
+        logger.info(f"Recording frames to {config[Configuration.CFG_RECORD_FILE]}")
+        return RecordingDriver(driver, config[Configuration.CFG_RECORD_FILE])
+    return driver
+
+
+def stop_recording(driver):
+    """
+    Close the frame log if the driver is recording
+    :param driver: The driver returned by record_frames()
+    :return: The wrapped driver
+    """
+    if isinstance(driver, RecordingDriver):
+        driver.close_log()
+        return driver.driver
+    return driver
+
 
 def run_apa_dotstar():
     """
@@ -126,27 +260,21 @@ def run_apa_dotstar():
     :return:
     """
     config = Configuration.get_configuration()
-    clk_pin = config[Configuration.CFG_SPI_CLK]
-    tx_pin = config[Configuration.CFG_SPI_TX]
-    rx_pin = config[Configuration.CFG_SPI_RX]
-    pixels = config[Configuration.CFG_PIXELS]
-    color_order = config[Configuration.CFG_ORDER]
-    script_file = script_to_run()
 
     # Run the AHLED code from here
     logger.info("Running the AHLED code")
 
     # Compile the script
-    engine = compile_script(script_file)
+    engine, calendar, switch_time = compile_show()
     if engine is None:
         # Compile failed
         return
 
     # Execute
-    spi = SPI(0, sck=Pin(clk_pin), mosi=Pin(tx_pin), miso=Pin(rx_pin))
-    driver = MPDotStar()
-    driver.open(spi, pixels, order=color_order)
-    engine.execute(driver)
+    driver = open_dotstar(config)
+    driver = record_frames(driver)
+    execute_show(engine, driver, calendar, switch_time)
+    stop_recording(driver)
 
 
 def run_ws281x():
@@ -155,29 +283,21 @@ def run_ws281x():
     :return:
     """
     config = Configuration.get_configuration()
-    datapin = config[Configuration.CFG_DATAPIN]
-    pixels = config[Configuration.CFG_PIXELS]
-    color_order = config[Configuration.CFG_ORDER].upper()
-    script_file = script_to_run()
-
-    logger.info(f"datapin: {datapin}")
-    logger.info((f"color_order: {color_order}"))
-    logger.info(f"script_file: {script_file}")
 
     # Run the AHLED code from here
     logger.info("Running the AHLED code")
 
     # Compile the script
-    engine = compile_script(script_file)
+    engine, calendar, switch_time = compile_show()
     if engine is None:
         # Compile failed
         return
 
     # Execute
-    gc.collect()
-    driver = WS281XDriver()
-    driver.open(pixels, datapin=datapin, order=color_order)
-    engine.execute(driver)
+    driver = open_ws281x(config)
+    driver = record_frames(driver)
+    execute_show(engine, driver, calendar, switch_time)
+    driver = stop_recording(driver)
     driver.close()
 
 
@@ -187,30 +307,54 @@ def run_non_addressable_led():
     :return: None
     """
     config = Configuration.get_configuration()
-    red_pin = config[Configuration.CFG_RED_PIN]
-    green_pin = config[Configuration.CFG_GREEN_PIN]
-    blue_pin = config[Configuration.CFG_BLUE_PIN]
-    pwm_freq = config[Configuration.CFG_PWM_FREQ]
-    brightness = float(config[Configuration.CFG_BRIGHTNESS]) / 100.0
-    script_file = script_to_run()
-    logger.info(f"RGB pins: {red_pin}, {green_pin}, {blue_pin}")
-    logger.info(f"PWM freq: {pwm_freq}")
-    logger.info(f"Brightness: {brightness}")
 
     # Run the AHLED code from here
     logger.info("Running the AHLED code")
 
     # Compile the script
-    engine = compile_script(script_file)
+    engine, calendar, switch_time = compile_show()
     if engine is None:
         # Compile failed
         return
 
     # Execute
-    driver = MPNALEDString()
-    driver.open(red_pin=red_pin, green_pin=green_pin, blue_pin=blue_pin, pwm_freq=pwm_freq)
-    driver.setBrightness(brightness)
-    engine.execute(driver)
+    driver = open_na(config)
+    driver = record_frames(driver)
+    execute_show(engine, driver, calendar, switch_time)
+    stop_recording(driver)
+
+
+def run_outputs():
+    """
+    Run the zones of several LED strings (outputs) on one engine
+    :return: None
+    """
+    config = Configuration.get_configuration()
+    outputs = config[Configuration.CFG_OUTPUTS]
+
+    # Run the AHLED code from here
+    logger.info("Running the AHLED code")
+
+    # Compile the scripts of every output
+    gc.collect()
+    engine = LEDEngine()
+    if not engine.compile_outputs(outputs):
+        logger.error("Output compile failed")
+        return
+
+    # Execute
+    drivers = []
+    try:
+        for output in outputs:
+            driver = open_output(output)
+            if driver is None:
+                return
+            logger.info(f"Output {len(drivers)}: {driver.name}")
+            drivers.append(driver)
+        engine.execute_outputs(drivers)
+    finally:
+        for driver in drivers:
+            driver.close()
 
 
 def run():
@@ -282,6 +426,11 @@ def run():
             logger.info("Press ctrl-c to terminate")
             run_ws281x()
             logger.info("WS281X/Neopixel ended")
+        elif run_code == "outputs":
+            logger.info("Outputs are running...")
+            logger.info("Press ctrl-c to terminate")
+            run_outputs()
+            logger.info("Outputs ended")
         elif run_code == "onboard-led":
             logger.info("Onboard LED is running...")
             logger.info("Press ctrl-c to terminate")
@@ -294,6 +443,8 @@ def run():
             logger.info("Non-addressable LED string test ended")
         elif run_code == "set_rtc":
             set_rtc()
+        elif run_code == "benchmark":
+            run_driver_benchmark(datapin=config[Configuration.CFG_DATAPIN])
         elif run_code == "exit":
             pass
         else:
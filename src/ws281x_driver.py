@@ -10,14 +10,26 @@
 #
 
 from .driver_base import DriverBase
+from .rotating_frame import RotatingFrame
 from neopixel import NeoPixel
 import machine
 
 class WS281XDriver(DriverBase):
     def __init__(self):
         super().__init__()
-        self._brightness = 1.0
+        # Until a brightness is set, the historical default of 1 (out of 255) applies
+        self._level = 1.0
+        self._build_lut()
         self._order = "RGB"
+        # Pixels are set in the frame buffer. The NeoPixel buffer is the output buffer.
+        self._frame = None
+        self._buf = None
+        # An all zero frame used to clear the frame buffer
+        self._blank = None
+        # Byte offsets of red, green and blue within a pixel
+        self._red_offset = 0
+        self._green_offset = 1
+        self._blue_offset = 2
 
     @property
     def name(self):
@@ -40,20 +52,46 @@ class WS281XDriver(DriverBase):
         :return:
         """
         self._numpixels = num_pixels
-        self._order = order
+        self._buf = self._open_strip(datapin, num_pixels)
+        self._frame = bytearray(len(self._buf))
+        self._blank = bytearray(len(self._buf))
 
+        # Pixels are written directly into the frame buffer in wire order. The NeoPixel
+        # class applies its own (GRB) ordering, so it is folded into the configured order
+        # here. This keeps the wire order of existing configurations unchanged.
+        offsets = self._compile_order(order)
+        self._red_offset = NeoPixel.ORDER[offsets[0]]
+        self._green_offset = NeoPixel.ORDER[offsets[1]]
+        self._blue_offset = NeoPixel.ORDER[offsets[2]]
+        return self._begin()
+
+    def _open_strip(self, datapin, num_pixels):
+        """
+        Create the NeoPixel instance that sends frames
+        :param datapin: The GPIO pin number that will drive the LED string
+        :param num_pixels: Number of pixels in string
+        :return: The output buffer
+        """
         # 3 bytes/pixel at 800 Khz
         self._strip = NeoPixel(machine.Pin(datapin), num_pixels, bpp=3, timing=1)
-        return self._begin()
+        return self._strip.buf
 
     def _begin(self):
         return True
 
-    def show(self):
+    def _show(self, force):
         """
-        Send all pixels to the string
+        Send all pixels to the string. Gamma correction and brightness
+        are applied to the whole frame as it is copied to the output buffer.
+        :param force: True to send the frame even if it has not changed
         :return:
         """
+        if not self._frame_changed(self._frame, force):
+            return True
+        if self._lut_identity:
+            self._buf[:] = self._frame
+        else:
+            self._apply_lut(self._frame, self._buf)
         self._strip.write()
         return True
 
@@ -65,13 +103,22 @@ class WS281XDriver(DriverBase):
         """
         return self._numpixels
 
+    @property
+    def frameBuffer(self):
+        """
+        Returns the frame buffer (wire order, before gamma/brightness)
+        :return:
+        """
+        return self._frame
+
     def setBrightness(self, brightness):
         """
         Set the relative brightness for the entire string
         :param brightness: 0-255
         :return:
         """
-        self._brightness = brightness
+        self._level = brightness
+        self._build_lut()
         return True
 
     def setPixelColor(self, index, color_value):
@@ -81,15 +128,78 @@ class WS281XDriver(DriverBase):
         :param color_value: 0xrrggbb
         :return: None
         """
-        # Apply brightness factor here
+        # Brightness is applied by show()
         # print(f"{color_value}={hex(color_value)}")
-        r = (color_value >> 16) & 0xFF
-        g = (color_value >> 8) & 0xFF
-        b = color_value & 0xFF
-        r = int((r * self._brightness) / 255)
-        g = int((g * self._brightness) / 255)
-        b = int((b * self._brightness) / 255)
-        self._strip[index] = (r, g, b)
+        offset = index * 3
+        frame = self._frame
+        self._dirty = True
+        frame[offset + self._red_offset] = (color_value >> 16) & 0xFF
+        frame[offset + self._green_offset] = (color_value >> 8) & 0xFF
+        frame[offset + self._blue_offset] = color_value & 0xFF
+        return True
+
+    def setPixels(self, rgb_buf, start=0):
+        """
+        Set consecutive pixels from a packed r, g, b buffer
+        :param rgb_buf: A bytearray of 3 bytes per pixel (num_pixels * 3 for all pixels)
+        :param start: Index of the first pixel to be set
+        :return:
+        """
+        frame = self._frame
+        base = start * 3
+        if self._red_offset == 0 and self._green_offset == 1 and self._blue_offset == 2:
+            # The frame is in r, g, b order
+            frame[base:base + len(rgb_buf)] = rgb_buf
+        else:
+            red_offset = base + self._red_offset
+            green_offset = base + self._green_offset
+            blue_offset = base + self._blue_offset
+            for offset in range(0, len(rgb_buf), 3):
+                frame[offset + red_offset] = rgb_buf[offset]
+                frame[offset + green_offset] = rgb_buf[offset + 1]
+                frame[offset + blue_offset] = rgb_buf[offset + 2]
+        self._dirty = True
+        return True
+
+    def clearPixels(self, start, count):
+        """
+        Clear (turn off) a range of pixels without showing them
+        :param start: Index of the first pixel to be cleared
+        :param count: Number of pixels to be cleared
+        :return:
+        """
+        self._frame[start * 3:(start + count) * 3] = memoryview(self._blank)[:count * 3]
+        self._dirty = True
+        return True
+
+    def createPattern(self, colors):
+        """
+        Create a rotating frame pattern in frame buffer (wire) order
+        :param colors: A sequence of 0xrrggbb values
+        :return: A RotatingFrame instance
+        """
+        pattern = bytearray(len(colors) * 3)
+        offset = 0
+        for color_value in colors:
+            pattern[offset + self._red_offset] = (color_value >> 16) & 0xFF
+            pattern[offset + self._green_offset] = (color_value >> 8) & 0xFF
+            pattern[offset + self._blue_offset] = color_value & 0xFF
+            offset += 3
+        return RotatingFrame(pattern, 3)
+
+    def setPattern(self, pattern, start=0, count=None):
+        """
+        Set pixels from a rotating frame pattern starting at the
+        pattern's head
+        :param pattern: A RotatingFrame created by createPattern
+        :param start: Index of the first pixel to be set
+        :param count: Number of pixels to be set (default: all)
+        :return:
+        """
+        if count is None:
+            count = self._numpixels
+        pattern.copy_into(self._frame, start * 3, count)
+        self._dirty = True
         return True
 
     def clear(self):
@@ -97,9 +207,9 @@ class WS281XDriver(DriverBase):
         Clear all pixels
         :return:
         """
-        for i in range(self._numpixels):
-            self._strip[i] = (0, 0, 0)
-        self._strip.write()
+        self._frame[:] = self._blank
+        self._dirty = True
+        self.show()
         return True
 
 
@@ -110,4 +220,7 @@ class WS281XDriver(DriverBase):
         """
         del self._strip
         self._strip = None
+        self._buf = None
+        self._frame = None
+        self._blank = None
         return True
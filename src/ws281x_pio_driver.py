@@ -0,0 +1,155 @@
+#
+# ws281x_pio_driver.py - WS281X/Neopixel driver that sends frames by PIO and DMA
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# This driver needs the rp2 module with rp2.DMA (MicroPython 1.22 or later).
+#
+
+import time
+import rp2
+from machine import Pin
+from .ws281x_driver import WS281XDriver
+
+
+# One bit per 10 PIO cycles at 8MHz (800KHz). Bytes are shifted out MSB first.
+@rp2.asm_pio(sideset_init=rp2.PIO.OUT_LOW, out_shiftdir=rp2.PIO.SHIFT_LEFT, autopull=True, pull_thresh=8)
+def _ws2812():
+    T1 = 2
+    T2 = 5
+    T3 = 3
+    wrap_target()
+    label("bitloop")
+    out(x, 1)               .side(0)    [T3 - 1]
+    jmp(not_x, "do_zero")   .side(1)    [T1 - 1]
+    jmp("bitloop")          .side(1)    [T2 - 1]
+    label("do_zero")
+    nop()                   .side(0)    [T2 - 1]
+    wrap()
+
+
+# PIO TX FIFO registers and DMA requests
+_PIO_BASE = (0x50200000, 0x50300000)
+_PIO_TXF0 = 0x010
+_DREQ_PIO1_TX0 = 8
+
+
+class WS281XPIODriver(WS281XDriver):
+    """
+    A WS281X driver that sends the output buffer to a PIO state machine
+    with DMA, one byte per transfer. show_start() starts the transfer
+    and returns, so the CPU is free (e.g. to send an SPI string) while
+    this string is sent. Pixels, patterns, gamma and brightness work
+    exactly as they do in WS281XDriver.
+    """
+    # The string latches a frame after the data line is low this long
+    RESET_US = 300
+
+    def __init__(self, state_machine=0):
+        """
+        Create the driver
+        :param state_machine: PIO state machine id 0-7 (4-7 are on PIO1)
+        """
+        super().__init__()
+        self._sm_id = state_machine
+        self._sm = None
+        self._dma = None
+        self._txf = 0
+        self._dma_ctrl = 0
+        self._sending = False
+        self._sent_us = time.ticks_us()
+
+    @property
+    def name(self):
+        return "WS281X/Neopixel PIO"
+
+    @property
+    def Device(self):
+        """
+        Returns the PIO state machine
+        """
+        return self._sm
+
+    @property
+    def sends_in_background(self):
+        return True
+
+    def _open_strip(self, datapin, num_pixels):
+        """
+        Start the state machine and claim a DMA channel
+        :param datapin: The GPIO pin number that will drive the LED string
+        :param num_pixels: Number of pixels in string
+        :return: The output buffer
+        """
+        pio = self._sm_id // 4
+        index = self._sm_id % 4
+        self._sm = rp2.StateMachine(self._sm_id, _ws2812, freq=8_000_000, sideset_base=Pin(datapin))
+        self._sm.active(1)
+        self._dma = rp2.DMA()
+        self._txf = _PIO_BASE[pio] + _PIO_TXF0 + (4 * index)
+        # Byte reads from the buffer. A byte written to the FIFO is replicated
+        # across the word, so the top byte is shifted out first.
+        self._dma_ctrl = self._dma.pack_ctrl(size=0, inc_write=False,
+                                             treq_sel=(pio * _DREQ_PIO1_TX0) + index)
+        return bytearray(num_pixels * 3)
+
+    def _show_start(self, force):
+        """
+        Start sending the frame
+        :param force: True to send the frame even if it has not changed
+        :return:
+        """
+        # The output buffer is in use until the last frame is sent
+        self._wait_sent()
+        if not self._frame_changed(self._frame, force):
+            return True
+        if self._lut_identity:
+            self._buf[:] = self._frame
+        else:
+            self._apply_lut(self._frame, self._buf)
+        gap = WS281XPIODriver.RESET_US - time.ticks_diff(time.ticks_us(), self._sent_us)
+        if gap > 0:
+            time.sleep_us(gap)
+        self._dma.config(read=self._buf, write=self._txf, count=len(self._buf),
+                         ctrl=self._dma_ctrl, trigger=True)
+        self._sending = True
+        return True
+
+    def _wait_sent(self):
+        """
+        Wait for the DMA transfer and the state machine's FIFO to empty
+        :return:
+        """
+        if not self._sending:
+            return True
+        while self._dma.active():
+            pass
+        while self._sm.tx_fifo():
+            pass
+        self._sent_us = time.ticks_us()
+        self._sending = False
+        return True
+
+    def _show(self, force):
+        self._show_start(force)
+        return self._wait_sent()
+
+    def close(self):
+        """
+        Release the state machine and DMA channel
+        :return: None
+        """
+        self._wait_sent()
+        self._dma.close()
+        self._dma = None
+        self._sm.active(0)
+        self._sm = None
+        self._buf = None
+        self._frame = None
+        self._blank = None
+        return True
@@ -0,0 +1,172 @@
+#
+# zone_scheduler.py - run several script CPUs on one or more LED strings
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+
+import time
+import mp_logging as logging
+
+
+logger = logging.getLogger("led")
+
+
+class ZoneScheduler:
+    """
+    Runs one script CPU per zone in lockstep on a shared frame clock.
+    A zone is a SegmentDriver of a string and a string can have several
+    zones. Each zone CPU is stepped as a generator (see
+    ScriptCPUBase.steps()) that yields the wait before its next frame.
+    On each tick of the clock every zone that is due is stepped, then
+    each string with a zone that asked for a frame is shown once, no
+    matter how many of its zones changed.
+
+    Strings are shown in two phases. Every string's show_start() is
+    called, strings that send in the background (PIO/DMA) first, then
+    every string's show_wait(). A background string is sent while an
+    SPI string is being written instead of after it.
+    """
+    def __init__(self, terminate_event, telemetry=None):
+        """
+        Create a scheduler
+        :param terminate_event: Ends all zones when set
+        :param telemetry: Optional FrameTelemetry for the frame clock
+        """
+        self._terminate_event = terminate_event
+        self._telemetry = telemetry
+        self._cpus = []
+        self._segments = []
+        # The strings in show_start() order and the string of each zone
+        self._drivers = []
+        self._zone_driver = []
+        self._show_requested = []
+        self._force_requested = []
+
+    def add_zone(self, cpu, segment):
+        """
+        Add a zone
+        :param cpu: A script CPU created with zoned=True
+        :param segment: The SegmentDriver the CPU runs on
+        :return: None
+        """
+        driver = segment.parent
+        if driver not in self._drivers:
+            # Strings that send in the background are started first
+            if driver.sends_in_background:
+                self._drivers.insert(0, driver)
+            else:
+                self._drivers.append(driver)
+            self._show_requested.append(False)
+            self._force_requested.append(False)
+        self._cpus.append(cpu)
+        self._segments.append(segment)
+
+    def _show(self):
+        """
+        Show each string that has a zone that asked for a frame
+        :return: None
+        """
+        drivers = self._drivers
+        show_requested = self._show_requested
+        force_requested = self._force_requested
+        shown = False
+        for segment in self._segments:
+            if segment.show_requested:
+                d = drivers.index(segment.parent)
+                show_requested[d] = True
+                force_requested[d] = force_requested[d] or segment.force_requested
+                segment.show_requested = False
+                segment.force_requested = False
+                shown = True
+        if not shown:
+            return
+
+        start = time.ticks_us()
+        for d in range(len(drivers)):
+            if show_requested[d]:
+                drivers[d].show_start(force_requested[d])
+        for d in range(len(drivers)):
+            if show_requested[d]:
+                drivers[d].show_wait()
+                show_requested[d] = False
+                force_requested[d] = False
+        if self._telemetry is not None:
+            self._telemetry.frame(time.ticks_diff(time.ticks_us(), start))
+
+    def _wait(self, wait_ms):
+        """
+        Wait for the next tick of the frame clock
+        :param wait_ms: Wait in milliseconds
+        :return: None
+        """
+        telemetry = self._telemetry
+        if telemetry is None:
+            time.sleep(wait_ms / 1000.0)
+            return
+        if telemetry.status_due():
+            telemetry.log_status()
+        telemetry.wait_started(wait_ms)
+        time.sleep(wait_ms / 1000.0)
+        telemetry.wait_ended()
+
+    def run(self):
+        """
+        Run all zones until every zone's script ends or the scheduler is terminated
+        :return: True if every zone ended without an error
+        """
+        count = len(self._cpus)
+        logger.info(f"Running {count} zones on {len(self._drivers)} strings")
+        telemetry = self._telemetry
+        if telemetry is not None:
+            telemetry.reset()
+
+        steps = []
+        for cpu in self._cpus:
+            cpu.start()
+            steps.append(cpu.steps())
+        # When each zone is next due (ticks_ms)
+        now = time.ticks_ms()
+        due = [now] * count
+        active = count
+
+        while active and not self._terminate_event.is_set():
+            now = time.ticks_ms()
+            for i in range(count):
+                if steps[i] is None or time.ticks_diff(due[i], now) > 0:
+                    continue
+                try:
+                    due[i] = time.ticks_add(now, int(next(steps[i])))
+                except StopIteration:
+                    steps[i] = None
+                    active -= 1
+            # One transmission per string for all of its zones
+            self._show()
+
+            # Sleep until the next zone is due
+            wait_ms = None
+            now = time.ticks_ms()
+            for i in range(count):
+                if steps[i] is not None:
+                    zone_wait = time.ticks_diff(due[i], now)
+                    if wait_ms is None or zone_wait < wait_ms:
+                        wait_ms = zone_wait
+            if wait_ms is not None and wait_ms > 0:
+                self._wait(wait_ms)
+
+        # Zones still running were terminated
+        for i in range(count):
+            if steps[i] is not None:
+                steps[i].close()
+        for cpu in self._cpus:
+            cpu.stop()
+        self._show()
+
+        if telemetry is not None:
+            telemetry.log_status()
+        logger.info("All zones stopped")
+        return all(cpu.run_result for cpu in self._cpus)
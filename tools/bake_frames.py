@@ -0,0 +1,225 @@
+#
+# bake_frames.py - render an LED script to a frame file on a host computer
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# The script is compiled and run by the same script engine that runs on
+# the Pico, but against a capture driver and a virtual clock, so baking
+# runs as fast as the host allows. Frames are sampled at a fixed period
+# and written with src/frame_file.py. The result can be played on the
+# Pico with the playframes statement.
+#
+# Usage:
+#   python tools/bake_frames.py script.led output.ledf --pixels 50 [--period 20] [--duration 60]
+#
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+# Run from anywhere: the repo root provides src, tools/host stands in for MicroPython
+# modules and lib provides the MicroPython helpers.
+# lib goes last so its datetime module does not hide the standard library's.
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+sys.path.insert(1, os.path.join(_root, "tools", "host"))
+sys.path.append(os.path.join(_root, "lib"))
+
+import mp_logging as logging
+from logger_device import LoggerDevice
+from src.script_vm import ScriptVM
+from src.script_compiler import ScriptCompiler
+from src.script_cpu_base import ScriptCPUBase
+from src.script_cpu_led import ScriptCPULED
+from src.driver_base import DriverBase
+from src.frame_file import FrameFileWriter
+
+
+logger = logging.getLogger("led")
+
+
+class HostLogger(LoggerDevice):
+    """
+    Log to stderr
+    """
+    def print(self, level, logdata):
+        print(f"{level}:{logdata}", file=sys.stderr)
+
+
+class VirtualClock:
+    """
+    Script time. It only advances when the script sleeps.
+    """
+    def __init__(self):
+        self.now_ms = 0.0
+
+    def sleep(self, seconds):
+        self.now_ms += seconds * 1000.0
+
+
+class CaptureDriver(DriverBase):
+    """
+    A driver that samples its frame at a fixed period of virtual time.
+    The frame is packed r, g, b with raw script colors. Brightness and
+    gamma are left to the driver that plays the file.
+    """
+    def __init__(self, pixels, clock, writer, duration_ms):
+        super().__init__()
+        self._numpixels = pixels
+        self._clock = clock
+        self._writer = writer
+        self._duration_ms = duration_ms
+        self._frame = bytearray(pixels * 3)
+        # The frame shown at the last show() and the next sample time
+        self._shown = bytearray(pixels * 3)
+        self._next_sample_ms = 0.0
+
+    @property
+    def name(self):
+        return "CaptureDriver"
+
+    def _sample_until(self, t_ms):
+        """
+        Write samples of the shown frame for every period before t_ms
+        :param t_ms: Virtual time
+        :return: None
+        """
+        end_ms = min(t_ms, self._duration_ms)
+        while self._next_sample_ms < end_ms:
+            self._writer.write_frame(self._shown)
+            self._next_sample_ms += self._writer.period_ms
+
+    def show(self, force=False):
+        # Samples up to now show the previous frame
+        self._sample_until(self._clock.now_ms)
+        self._shown[:] = self._frame
+        return True
+
+    def finish(self):
+        """
+        Sample the last frame through the end of the script (or the duration)
+        :return: None
+        """
+        # The last frame is sampled at least once
+        self._sample_until(max(self._clock.now_ms, self._next_sample_ms + 1))
+
+    def setPixelColor(self, index, color_value):
+        offset = index * 3
+        self._frame[offset] = (color_value >> 16) & 0xFF
+        self._frame[offset + 1] = (color_value >> 8) & 0xFF
+        self._frame[offset + 2] = color_value & 0xFF
+        return True
+
+    def setPixels(self, rgb_buf):
+        self._frame[:] = rgb_buf
+        return True
+
+    def clear(self):
+        self._frame[:] = bytes(len(self._frame))
+        self.show()
+        return True
+
+    @property
+    def numPixels(self):
+        return self._numpixels
+
+
+class BakeTerminateEvent:
+    """
+    Ends the script when the virtual clock reaches the bake duration
+    """
+    def __init__(self, clock, duration_ms):
+        self._clock = clock
+        self._duration_ms = duration_ms
+        self._terminated = False
+
+    def is_set(self):
+        return self._clock.now_ms >= self._duration_ms
+
+    def set_terminate_flag(self):
+        self._duration_ms = self._clock.now_ms
+
+    def set_terminated(self):
+        self._terminated = True
+
+    def is_terminated(self):
+        return self._terminated
+
+
+class BakeIdleWait:
+    """
+    Do-at and pause waits in virtual time
+    """
+    def __init__(self, clock, terminate_event):
+        self._clock = clock
+        self._terminate_event = terminate_event
+
+    def wait_for(self, seconds):
+        self._clock.sleep(seconds)
+        return not self._terminate_event.is_set()
+
+
+def bake(script_file, output_file, pixels, period_ms, duration_s):
+    """
+    Bake a script into a frame file
+    :param script_file: LED script
+    :param output_file: Frame file to be written
+    :param pixels: Number of pixels in the target string
+    :param period_ms: Frame period in milliseconds
+    :param duration_s: Longest time to run the script (seconds of script time)
+    :return: True if successful
+    """
+    vm = ScriptVM(script_file)
+    compiler = ScriptCompiler(vm)
+    if not compiler.compile(script_file):
+        return False
+
+    clock = VirtualClock()
+    duration_ms = duration_s * 1000.0
+    # Sleeping and the script's idea of the current time follow the virtual clock
+    time.sleep = clock.sleep
+    start_time = ScriptCPUBase._datetime_now()
+    ScriptCPUBase._datetime_now = staticmethod(
+        lambda: start_time + datetime.timedelta(milliseconds=clock.now_ms))
+
+    with open(output_file, "wb") as fh:
+        writer = FrameFileWriter(fh, pixels, period_ms)
+        driver = CaptureDriver(pixels, clock, writer, duration_ms)
+        terminate_event = BakeTerminateEvent(clock, duration_ms)
+        cpu = ScriptCPULED(driver, vm, terminate_event, idle_wait=BakeIdleWait(clock, terminate_event))
+        cpu.run()
+        driver.finish()
+        writer.close()
+
+    raw = writer.frame_count * pixels * 3
+    logger.info(f"{writer.frame_count} frames, {writer.bytes_written} bytes "
+                f"({raw} uncompressed), largest record {writer.max_payload} bytes")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render an LED script to a frame file")
+    parser.add_argument("script", help="LED script file")
+    parser.add_argument("output", help="Frame file to be written")
+    parser.add_argument("--pixels", type=int, required=True, help="Number of pixels in the string")
+    parser.add_argument("--period", type=int, default=20, help="Frame period in milliseconds")
+    parser.add_argument("--duration", type=float, default=60.0, help="Longest script time in seconds")
+    parser.add_argument("--log-level", default="info", help="debug, info, warning or error")
+    args = parser.parse_args()
+
+    logger.set_log_level(args.log_level)
+    logger.add_logger(HostLogger())
+    if not bake(args.script, args.output, args.pixels, args.period, args.duration):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
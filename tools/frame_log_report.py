@@ -0,0 +1,83 @@
+#
+# frame_log_report.py - report frame timing from a RecordingDriver frame log
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# Usage:
+#   python tools/frame_log_report.py frames.log [--target 20]
+#
+
+import argparse
+import math
+import os
+import sys
+
+# The repo root provides src, tools/host stands in for MicroPython modules
+# and lib provides the MicroPython helpers.
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _root)
+sys.path.insert(1, os.path.join(_root, "tools", "host"))
+sys.path.append(os.path.join(_root, "lib"))
+
+from src.recording_driver import read_frame_log, TICKS_PERIOD
+
+
+def report(log_path, target_ms=None):
+    """
+    Print frame count, interval statistics and jitter for a frame log
+    :param log_path: Frame log file
+    :param target_ms: The frame interval the script asks for, if known
+    :return: None
+    """
+    intervals = []
+    frames = 0
+    unchanged = 0
+    last_ticks = None
+    last_frame = None
+    for ticks, frame in read_frame_log(log_path):
+        frames += 1
+        if last_ticks is not None:
+            intervals.append((ticks - last_ticks) % TICKS_PERIOD)
+        if frame == last_frame:
+            unchanged += 1
+        last_ticks = ticks
+        last_frame = frame
+
+    print(f"Frames: {frames}")
+    print(f"Unchanged frames: {unchanged}")
+    if not intervals:
+        return
+
+    total = sum(intervals)
+    mean = total / len(intervals)
+    # Jitter is the standard deviation of the frame interval
+    jitter = math.sqrt(sum((i - mean) ** 2 for i in intervals) / len(intervals))
+    ordered = sorted(intervals)
+    print(f"Duration: {total} ms")
+    print(f"Interval mean: {mean:.2f} ms  min: {ordered[0]} ms  max: {ordered[-1]} ms")
+    print(f"Interval median: {ordered[len(ordered) // 2]} ms  "
+          f"95th percentile: {ordered[min(len(ordered) - 1, (len(ordered) * 95) // 100)]} ms")
+    print(f"Jitter (std dev): {jitter:.2f} ms")
+    if mean > 0:
+        print(f"Frame rate: {1000.0 / mean:.1f} fps")
+    if target_ms:
+        late = sum(1 for i in intervals if i > target_ms)
+        print(f"Target: {target_ms} ms  late frames: {late} ({(100.0 * late) / len(intervals):.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report frame timing from a frame log")
+    parser.add_argument("log", help="Frame log written by RecordingDriver")
+    parser.add_argument("--target", type=float, default=None, help="Expected frame interval in ms")
+    args = parser.parse_args()
+    report(args.log, args.target)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
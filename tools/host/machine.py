@@ -0,0 +1,97 @@
+#
+# machine.py - CPython stand-in for the MicroPython machine module
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# The classes accept the arguments the LED drivers use and do nothing
+# with the hardware. Timers do not run; call the callback to step them.
+# lightsleep() sleeps for its timeout like a timer wakeup would.
+#
+
+import time
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._value = value if value is not None else 0
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+    def irq(self, handler=None, trigger=None):
+        return None
+
+
+class PWM:
+    def __init__(self, pin):
+        self.pin = pin
+        self._freq = 0
+        self._duty = 0
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = value
+
+    def deinit(self):
+        pass
+
+
+class SPI:
+    def __init__(self, id, baudrate=1000000, **kwargs):
+        self.id = id
+        self.bytes_written = 0
+
+    def write(self, buf):
+        self.bytes_written += len(buf)
+
+    def deinit(self):
+        pass
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, callback=None, **kwargs):
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, **kwargs):
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+
+    def deinit(self):
+        self.callback = None
+
+
+def freq():
+    return 125000000
+
+
+def lightsleep(time_ms=None):
+    # Without a timeout only a pin would wake the board
+    if time_ms is not None:
+        time.sleep(time_ms / 1000.0)
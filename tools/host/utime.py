@@ -0,0 +1,58 @@
+#
+# utime.py - CPython stand-in for the MicroPython utime module
+# © 2022 by Dave Hocker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# Only what the LED code uses on a host is provided. Ticks wrap at 2**30
+# like they do on the Pico.
+#
+
+import time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+_start = time.monotonic_ns()
+
+
+def ticks_ms():
+    return ((time.monotonic_ns() - _start) // 1000000) & _TICKS_MAX
+
+
+def ticks_us():
+    return ((time.monotonic_ns() - _start) // 1000) & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000.0)
+
+
+def sleep_us(us):
+    time.sleep(us / 1000000.0)
+
+
+def localtime(secs=None):
+    return time.localtime(secs)[0:8]
+
+
+def time_ns():
+    return time.time_ns()